@@ -1,12 +1,17 @@
 import React from 'react';
-import { Link } from 'react-router-dom';
+import { Link, useSearchParams } from 'react-router-dom';
 import { useStore } from './App'; 
 
 function LiveDashboard() {
   const { theme } = useStore(); 
+  const [searchParams] = useSearchParams();
+  const filtro = ['elevadores', 'predio', 'modo', 'janela', 'campo']
+    .filter((k) => searchParams.get(k))
+    .map((k) => `&${k}=${encodeURIComponent(searchParams.get(k))}`)
+    .join('');
 
 // MUDA O IP AQUI INFERNO
-const PYTHON_SERVER_URL = `http://192.168.1.169:5000?theme=${theme}`;
+const PYTHON_SERVER_URL = `http://192.168.1.169:5000?theme=${theme}${filtro}`;
 
   return (
     <div style={{
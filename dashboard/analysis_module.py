@@ -1,59 +1,75 @@
-import pandas as pd
 from sqlalchemy import create_engine
-from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+import time
+import estatisticas
+from instrumentacao import telemetria
 
-def format_stats(series, unit=""):
-    stats = series.describe()
+_engines = {}
+
+def get_engine(db_uri):
+    chave = str(db_uri)
+    if chave not in _engines:
+        _engines[chave] = create_engine(db_uri)
+    return _engines[chave]
+
+def format_stats(estado, unit=""):
+    mediana = estado['quantil'].valor()
     return {
-        'mean': f"{stats.get('mean', 0):.2f}{unit}",
-        'std': f"{stats.get('std', 0):.2f}{unit}",
-        'min': f"{stats.get('min', 0):.2f}{unit}",
-        'max': f"{stats.get('max', 0):.2f}{unit}",
-        'median': f"{stats.get('50%', 0):.2f}{unit}"
+        'mean': f"{estado['media']:.2f}{unit}",
+        'std': f"{estatisticas.desvio_padrao(estado):.2f}{unit}",
+        'min': f"{estado['minimo']:.2f}{unit}",
+        'max': f"{estado['maximo']:.2f}{unit}",
+        'median': f"{mediana if mediana is not None else 0:.2f}{unit}"
     }
 
-def get_peak_time(series):
-    if series.empty:
+def get_peak_time(estado):
+    if estado['ts_maximo'] is None:
         return None
-    peak_index = series.idxmax()
-    return peak_index.strftime('%Y-%m-%d %H:%M:%S')
+    return estado['ts_maximo'].strftime('%Y-%m-%d %H:%M:%S')
+
+def carregar_estatisticas(engine, elevador_id):
+    try:
+        with engine.begin() as conexao:
+            return estatisticas.obter(conexao, elevador_id)
+    except IntegrityError:
+        with engine.begin() as conexao:
+            return estatisticas.obter(conexao, elevador_id)
 
 def gerar_analise_elevador(db_uri, elevador_id):
-    engine = create_engine(db_uri)
-    
-    query = f"""
-        SELECT ts, ia, temp_c, vib_s1_ms2, tensao 
-        FROM sensor_log
-        WHERE elevador_id = '{elevador_id}'
-        ORDER BY ts ASC
-    """
+    engine = get_engine(db_uri)
     
     try:
-        df = pd.read_sql_query(query, engine, index_col='ts', parse_dates=['ts'])
+        inicio = time.perf_counter()
+        estados = {e['campo']: e for e in carregar_estatisticas(engine, elevador_id) if e['n']}
+        telemetria.observar('analise_carregar_estatisticas', inicio)
         
-        if df.empty:
+        if not estados:
             return {"status": "vazio", "mensagem": "Nenhum dado de sensor encontrado para este elevador."}
 
+        vazio = estatisticas.estado_vazio(elevador_id, None)
+        vazio.update(media=0.0, minimo=0.0, maximo=0.0)
+        ia, temp, vib, tensao = (estados.get(c, vazio) for c in ('ia', 'temp_c', 'vib_s1_ms2', 'tensao'))
+
         analise = {
             'status': 'sucesso',
-            'periodo_inicio': df.index.min().isoformat(),
-            'periodo_fim': df.index.max().isoformat(),
-            'total_leituras': len(df),
+            'periodo_inicio': min(e['inicio'] for e in estados.values()).isoformat(),
+            'periodo_fim': max(e['fim'] for e in estados.values()).isoformat(),
+            'total_leituras': max(e['n'] for e in estados.values()),
             'estatisticas': {
-                'corrente_A': format_stats(df['ia'], ' A'),
-                'temperatura_C': format_stats(df['temp_c'], ' °C'),
-                'vibracao_ms2': format_stats(df['vib_s1_ms2'], ' m/s²'),
-                'tensao_V': format_stats(df['tensao'], ' V'),
+                'corrente_A': format_stats(ia, ' A'),
+                'temperatura_C': format_stats(temp, ' °C'),
+                'vibracao_ms2': format_stats(vib, ' m/s²'),
+                'tensao_V': format_stats(tensao, ' V'),
             },
             'picos_registrados': {
-                'pico_corrente_A': f"{df['ia'].max():.2f} A (em {get_peak_time(df['ia'])})",
-                'pico_temperatura_C': f"{df['temp_c'].max():.2f} °C (em {get_peak_time(df['temp_c'])})",
-                'pico_vibracao_ms2': f"{df['vib_s1_ms2'].max():.2f} m/s² (em {get_peak_time(df['vib_s1_ms2'])}",
+                'pico_corrente_A': f"{ia['maximo']:.2f} A (em {get_peak_time(ia)})",
+                'pico_temperatura_C': f"{temp['maximo']:.2f} °C (em {get_peak_time(temp)})",
+                'pico_vibracao_ms2': f"{vib['maximo']:.2f} m/s² (em {get_peak_time(vib)})",
             }
         }
         
         return analise
 
     except Exception as e:
-        print(f"Erro na análise com Pandas: {e}")
+        print(f"Erro na análise incremental: {e}")
         return {"status": "erro", "mensagem": f"Erro ao gerar análise: {e}"}
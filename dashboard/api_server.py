@@ -2,11 +2,15 @@ import os
 from flask import Flask
 from extensions import db, jwt, cors
 from routes import api_bp
+from instrumentacao import metricas_bp
+from ingestao import buffer_sensores
 import etl_job
+import particoes
+import retencao
 from apscheduler.schedulers.background import BackgroundScheduler
 
 basedir = os.path.abspath(os.path.dirname(__file__))
-DB_URI = 'sqlite:///' + os.path.join(basedir, 'ascensus.db')
+DB_URI = 'sqlite:///' + os.environ.get('ASCENSUS_DB', os.path.join(basedir, 'ascensus.db'))
 
 def create_app():
     app = Flask(__name__)
@@ -18,20 +22,28 @@ def create_app():
     db.init_app(app)
     jwt.init_app(app)
     cors.init_app(app)
+    buffer_sensores.init_app(app)
 
     app.register_blueprint(api_bp)
+    app.register_blueprint(metricas_bp)
     
     return app
 
 app = create_app()
 
+def iniciar_agendador():
+    scheduler = BackgroundScheduler(daemon=True)
+    scheduler.add_job(etl_job.rodar_job_agregacao_diaria, 'cron', kwargs={'db_uri': DB_URI}, hour=1, minute=0)
+    scheduler.add_job(particoes.rodar_manutencao, 'cron', args=[DB_URI], day=1, hour=2, minute=0)
+    scheduler.add_job(retencao.rodar_retencao, 'cron', args=[DB_URI], hour=3, minute=0)
+    scheduler.start()
+    return scheduler
+
 if __name__ == '__main__':
     with app.app_context():
         db.create_all() 
     
-    scheduler = BackgroundScheduler(daemon=True)
-    scheduler.add_job(etl_job.rodar_job_agregacao_diaria, 'trigger', 'cron', hour=1, minute=0)
-    scheduler.start()
+    iniciar_agendador()
     
     print("Iniciando Servidor API (Banco de Dados) em http://0.0.0.0:5001")
     app.run(host='0.0.0.0', port=5001, debug=True, use_reloader=False)
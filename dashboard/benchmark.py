@@ -0,0 +1,403 @@
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+import itertools
+import threading
+import subprocess
+from datetime import datetime, timedelta
+import requests
+from simple_websocket import Client, ConnectionClosed
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+DIRETORIO_BENCHMARK = os.path.join(basedir, 'benchmark')
+DB_BENCHMARK = os.path.join(DIRETORIO_BENCHMARK, 'ascensus_bench.db')
+BASELINE = os.path.join(basedir, 'benchmark_baseline.json')
+API_PADRAO = 'http://127.0.0.1:5001'
+DASHBOARD_PADRAO = 'http://127.0.0.1:5000'
+TECNICO = {'id': 'bench', 'username': 'bench', 'password': 'bench'}
+PREFIXO_ELEVADOR = 'bench-'
+TOLERANCIA_PADRAO = 0.25
+
+def percentil(valores, q):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(q * len(ordenados)))]
+
+def resumir_latencias(latencias_ms):
+    return {
+        'p50_ms': percentil(latencias_ms, 0.50),
+        'p99_ms': percentil(latencias_ms, 0.99),
+        'max_ms': max(latencias_ms) if latencias_ms else None
+    }
+
+def ids_elevadores(quantidade):
+    return [f"{PREFIXO_ELEVADOR}{i:04d}" for i in range(quantidade)]
+
+def leitura_bunny_buddy(elevador_id, passo, sequencia=0):
+    fase = passo / 30.0
+    return {
+        'id_elevador': elevador_id,
+        'ia': round(max(0.0, random.gauss(5.0 + 2.0 * abs(((fase % 2) - 1)), 0.4)), 2),
+        'temp_c': round(random.gauss(32.0, 0.8), 2),
+        'vib_s1_ms2': round(abs(random.gauss(0.05, 0.03)), 3),
+        'velocidade': float(sequencia),
+        'estado': int(fase) % 3,
+        'dist_l1': random.randint(180, 200), 'dist_l2': random.randint(180, 200),
+        'dist_o1': random.randint(150, 200), 'dist_o2': random.randint(150, 200),
+        'altura': round((fase % 10) * 3.0, 2)
+    }
+
+def semear(caminho_db=DB_BENCHMARK, elevadores=50, meses=3, leituras_por_dia=288, semente=42):
+    os.makedirs(os.path.dirname(caminho_db), exist_ok=True)
+    for sufixo in ('', '-wal', '-shm'):
+        if os.path.exists(caminho_db + sufixo):
+            os.remove(caminho_db + sufixo)
+    os.environ['ASCENSUS_DB'] = caminho_db
+
+    import migracoes
+    from api_server import app, DB_URI
+    from extensions import db
+    from models import Tecnico, Elevador
+    from sqlalchemy import create_engine
+    import etl_job
+    import particoes
+    import estatisticas
+    from modelos_anomalia import registro_modelos
+
+    migracoes.migrar()
+    ids = ids_elevadores(elevadores)
+    with app.app_context():
+        db.session.add(Tecnico(**TECNICO))
+        for i, elevador_id in enumerate(ids):
+            db.session.add(Elevador(id=elevador_id, nome=f"Elevador {i}", predio=f"Prédio {i // 10}", tecnico_id=TECNICO['id']))
+        db.session.commit()
+    for elevador_id in ids:
+        registro_modelos.remover(elevador_id)
+
+    random.seed(semente)
+    hoje = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    inicio = hoje - timedelta(days=30 * meses)
+    passo = timedelta(seconds=86400 / leituras_por_dia)
+    conexao = sqlite3.connect(caminho_db)
+    total = 0
+    inicio_semeadura = time.perf_counter()
+    dia = inicio
+    while dia < hoje:
+        linhas = []
+        for elevador_id in ids:
+            ts = dia
+            for n in range(leituras_por_dia):
+                leitura = leitura_bunny_buddy(elevador_id, n)
+                linhas.append((ts.strftime('%Y-%m-%d %H:%M:%S.%f'), leitura['ia'], leitura['temp_c'], leitura['vib_s1_ms2'],
+                               min(20.0, leitura['ia'] * 2.0), 1.0, elevador_id))
+                ts += passo
+        conexao.executemany(
+            "INSERT INTO sensor_log (ts, ia, temp_c, vib_s1_ms2, tensao, velocidade, elevador_id) VALUES (?, ?, ?, ?, ?, ?, ?)", linhas)
+        conexao.commit()
+        total += len(linhas)
+        dia += timedelta(days=1)
+    conexao.close()
+    print(f"{total} leituras sintéticas gravadas em {time.perf_counter() - inicio_semeadura:.1f}s.")
+
+    engine = create_engine(DB_URI)
+    particoes.arquivar_meses_fechados(engine)
+    dia = inicio
+    while dia < hoje:
+        linhas = etl_job.agregar_shard(DB_URI, ids, dia, dia + timedelta(days=1))
+        with engine.begin() as conexao_etl:
+            etl_job.gravar_analises(conexao_etl, dia, linhas)
+        dia += timedelta(days=1)
+    with engine.begin() as conexao_estatisticas:
+        for elevador_id in ids:
+            estatisticas.semear(conexao_estatisticas, elevador_id)
+    engine.dispose()
+    print(f"Banco de benchmark pronto em {caminho_db}: {elevadores} elevadores, {(hoje - inicio).days} dias.")
+
+class Visualizadores:
+    def __init__(self, url_ws, quantidade, enviados):
+        self.url_ws = url_ws
+        self.quantidade = quantidade
+        self.enviados = enviados
+        self.atrasos_ms = []
+        self.frames = 0
+        self.erros = 0
+        self._ativo = True
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def iniciar(self):
+        for i in range(self.quantidade):
+            thread = threading.Thread(target=self._loop, name=f"visualizador-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _loop(self):
+        try:
+            cliente = Client.connect(self.url_ws)
+        except Exception:
+            with self._lock:
+                self.erros += 1
+            return
+        try:
+            while self._ativo:
+                mensagem = cliente.receive(timeout=0.5)
+                if mensagem is None:
+                    continue
+                agora = time.perf_counter()
+                dados = json.loads(mensagem)
+                enviado_em = self.enviados.get(dados.get('velocidade')) if isinstance(dados, dict) else None
+                if enviado_em is not None:
+                    with self._lock:
+                        self.frames += 1
+                        self.atrasos_ms.append((agora - enviado_em) * 1000.0)
+        except ConnectionClosed:
+            with self._lock:
+                self.erros += 1
+        finally:
+            cliente.close()
+
+    def parar(self):
+        self._ativo = False
+        for thread in self._threads:
+            thread.join(timeout=2.0)
+
+def ultimo_id_gravado(caminho_db):
+    if not caminho_db or not os.path.exists(caminho_db):
+        return None
+    conexao = sqlite3.connect(f"file:{caminho_db}?mode=ro", uri=True, timeout=10)
+    try:
+        return conexao.execute("SELECT COALESCE(MAX(id), 0) FROM sensor_log").fetchone()[0]
+    finally:
+        conexao.close()
+
+def aguardar_gravacao(caminho_db, antes, timeout_s=15.0, estavel_s=1.5):
+    if antes is None:
+        return None
+    ultimo, estavel_desde = None, time.monotonic()
+    limite = time.monotonic() + timeout_s
+    while time.monotonic() < limite:
+        atual = ultimo_id_gravado(caminho_db)
+        if atual != ultimo:
+            ultimo, estavel_desde = atual, time.monotonic()
+        elif time.monotonic() - estavel_desde >= estavel_s:
+            break
+        time.sleep(0.2)
+    return ultimo - antes
+
+def gerar_carga(alvo, api, dashboard, elevadores, taxa_hz, duracao_s, conexoes, sequencia, enviados):
+    latencias_ms, erros = [], [0]
+    lock = threading.Lock()
+    atrasado = [0]
+    inicio = time.perf_counter()
+    fim = inicio + duracao_s
+
+    def trabalhador(indice):
+        sessao = requests.Session()
+        meus = elevadores[indice::conexoes]
+        if not meus:
+            return
+        intervalo = 1.0 / (len(meus) * taxa_hz)
+        proximo = inicio + random.random() * intervalo
+        locais, erros_locais, passo = [], 0, 0
+        for elevador_id in itertools.cycle(meus):
+            agora = time.perf_counter()
+            if agora >= fim:
+                break
+            if proximo > agora:
+                time.sleep(proximo - agora)
+            elif agora - proximo > intervalo:
+                atrasado[0] += 1
+            proximo += intervalo
+            seq = next(sequencia)
+            leitura = leitura_bunny_buddy(elevador_id, passo, seq)
+            passo += 1
+            t0 = time.perf_counter()
+            enviados[float(seq)] = t0
+            try:
+                if alvo == 'sensor':
+                    resposta = sessao.post(f"{dashboard}/api/sensor", json=leitura, timeout=10)
+                else:
+                    leitura['t'] = int(time.time() * 1000)
+                    resposta = sessao.post(f"{api}/api/log_sensor/{elevador_id}", json=leitura, timeout=10)
+                if resposta.status_code >= 300:
+                    erros_locais += 1
+            except requests.RequestException:
+                erros_locais += 1
+            locais.append((time.perf_counter() - t0) * 1000.0)
+        with lock:
+            latencias_ms.extend(locais)
+            erros[0] += erros_locais
+
+    threads = [threading.Thread(target=trabalhador, args=(i,), daemon=True) for i in range(conexoes)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    decorrido = time.perf_counter() - inicio
+    resultado = {'requisicoes': len(latencias_ms), 'erros': erros[0], 'req_s': len(latencias_ms) / decorrido,
+                 'envios_atrasados': atrasado[0]}
+    resultado.update(resumir_latencias(latencias_ms))
+    return resultado, decorrido
+
+def medir_analises(api, token, elevadores, chamadas):
+    cabecalhos = {'Authorization': f"Bearer {token}"}
+    sessao = requests.Session()
+    resultados = {}
+    for nome, rota in (('analise', 'analise'), ('analise_diaria', 'analise_diaria')):
+        latencias_ms, erros, primeiras_ms = [], 0, []
+        for i in range(chamadas):
+            elevador_id = elevadores[i % len(elevadores)]
+            t0 = time.perf_counter()
+            resposta = sessao.get(f"{api}/api/{rota}/{elevador_id}", headers=cabecalhos, timeout=60)
+            decorrido_ms = (time.perf_counter() - t0) * 1000.0
+            if resposta.status_code != 200:
+                erros += 1
+            (primeiras_ms if i < len(elevadores) else latencias_ms).append(decorrido_ms)
+        resultados[nome] = {'chamadas': chamadas, 'erros': erros, 'primeira_p50_ms': percentil(primeiras_ms, 0.5)}
+        resultados[nome].update(resumir_latencias(latencias_ms or primeiras_ms))
+    return resultados
+
+def subir_servidores(caminho_db, api, dashboard):
+    ambiente = dict(os.environ, ASCENSUS_DB=caminho_db)
+    processos = [subprocess.Popen([sys.executable, os.path.join(basedir, nome)], cwd=basedir, env=ambiente,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                 for nome in ('api_server.py', 'dashboard_server.py')]
+    limite = time.monotonic() + 60
+    for url in (f"{api}/api/ingestao/metricas", f"{dashboard}/api/difusor/metricas"):
+        while True:
+            try:
+                if requests.get(url, timeout=1).status_code == 200:
+                    break
+            except requests.RequestException:
+                pass
+            if time.monotonic() > limite:
+                for processo in processos:
+                    processo.terminate()
+                raise RuntimeError(f"Servidor não respondeu em {url}")
+            time.sleep(0.3)
+    return processos
+
+def rodar(api=API_PADRAO, dashboard=DASHBOARD_PADRAO, caminho_db=DB_BENCHMARK, elevadores=50, taxa_hz=1.0, duracao_s=20.0, visualizadores=10,
+          conexoes=16, chamadas_analise=100, fases=('sensor', 'log_sensor', 'analises')):
+    resposta = requests.post(f"{api}/api/login", json={'username': TECNICO['username'], 'password': TECNICO['password']}, timeout=10)
+    if resposta.status_code != 200:
+        raise RuntimeError("Login do técnico de benchmark falhou; rode 'python benchmark.py semear' e suba a API com ASCENSUS_DB.")
+    token = resposta.json()['token']
+    ids = ids_elevadores(elevadores)
+    sequencia = itertools.count(1)
+    resultados = {'quando': datetime.now().isoformat(timespec='seconds'),
+                  'parametros': {'elevadores': elevadores, 'taxa_hz': taxa_hz, 'duracao_s': duracao_s,
+                                 'visualizadores': visualizadores, 'conexoes': conexoes}}
+
+    for alvo in [f for f in fases if f in ('sensor', 'log_sensor')]:
+        enviados = {}
+        painel = None
+        if alvo == 'sensor' and visualizadores:
+            url_ws = dashboard.replace('http', 'ws', 1) + '/ws/Bunny&Buddy'
+            painel = Visualizadores(url_ws, visualizadores, enviados)
+            painel.iniciar()
+            time.sleep(1.0)
+        antes = ultimo_id_gravado(caminho_db)
+        resultado, decorrido = gerar_carga(alvo, api, dashboard, ids, taxa_hz, duracao_s, conexoes, sequencia, enviados)
+        if painel:
+            time.sleep(1.0)
+            painel.parar()
+            esperados = resultado['requisicoes'] * visualizadores
+            resultados['fanout'] = {'frames': painel.frames, 'perdidos': max(0, esperados - painel.frames),
+                                    'visualizadores_com_erro': painel.erros}
+            resultados['fanout'].update(resumir_latencias(painel.atrasos_ms))
+        gravadas = aguardar_gravacao(caminho_db, antes)
+        if gravadas is not None:
+            resultado['linhas_gravadas'] = gravadas
+            resultado['linhas_s'] = gravadas / decorrido
+        resultados[alvo] = resultado
+
+    if 'analises' in fases:
+        resultados.update(medir_analises(api, token, ids, chamadas_analise))
+    return resultados
+
+def comparar(resultados, baseline, tolerancia=TOLERANCIA_PADRAO):
+    regressoes = []
+    for secao, metricas in baseline.items():
+        if not isinstance(metricas, dict) or secao == 'parametros':
+            continue
+        for nome, referencia in metricas.items():
+            atual = resultados.get(secao, {}).get(nome)
+            if not isinstance(referencia, (int, float)) or not isinstance(atual, (int, float)) or referencia <= 0:
+                continue
+            if nome.endswith(('p50_ms', 'p99_ms')) and atual > referencia * (1 + tolerancia):
+                regressoes.append(f"{secao}.{nome}: {atual:.1f} ms (baseline {referencia:.1f} ms)")
+            elif nome.endswith('_s') and not nome.endswith('_ms') and atual < referencia * (1 - tolerancia):
+                regressoes.append(f"{secao}.{nome}: {atual:.1f}/s (baseline {referencia:.1f}/s)")
+    return regressoes
+
+def imprimir(resultados):
+    for secao, metricas in resultados.items():
+        if isinstance(metricas, dict) and secao != 'parametros':
+            valores = ', '.join(f"{k}={v:.1f}" if isinstance(v, float) else f"{k}={v}" for k, v in metricas.items())
+            print(f"{secao:>15}: {valores}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark de ingestão, difusão ao vivo e análises com uma frota sintética.")
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    p_semear = sub.add_parser('semear', help="cria um banco separado com meses de leituras sintéticas")
+    p_semear.add_argument('--db', default=DB_BENCHMARK)
+    p_semear.add_argument('--elevadores', type=int, default=50)
+    p_semear.add_argument('--meses', type=int, default=3)
+    p_semear.add_argument('--leituras-por-dia', type=int, default=288)
+
+    p_rodar = sub.add_parser('rodar', help="gera a carga e mede latências, vazão e atraso de difusão")
+    p_rodar.add_argument('--api', default=API_PADRAO)
+    p_rodar.add_argument('--dashboard', default=DASHBOARD_PADRAO)
+    p_rodar.add_argument('--elevadores', type=int, default=50, help="elevadores simulados (precisam existir no banco semeado)")
+    p_rodar.add_argument('--taxa-hz', type=float, default=1.0, help="leituras por segundo de cada elevador")
+    p_rodar.add_argument('--duracao-s', type=float, default=20.0)
+    p_rodar.add_argument('--visualizadores', type=int, default=10, help="WebSockets abertos em /ws/Bunny&Buddy")
+    p_rodar.add_argument('--conexoes', type=int, default=16, help="conexões HTTP paralelas do gerador")
+    p_rodar.add_argument('--chamadas-analise', type=int, default=100)
+    p_rodar.add_argument('--fases', default='sensor,log_sensor,analises')
+    p_rodar.add_argument('--subir', action='store_true', help="sobe api_server.py e dashboard_server.py apontando para --db")
+    p_rodar.add_argument('--db', default=DB_BENCHMARK, help="banco semeado (usado por --subir e para contar as linhas gravadas)")
+    p_rodar.add_argument('--baseline', default=BASELINE)
+    p_rodar.add_argument('--salvar-baseline', action='store_true', help="grava o resultado como nova baseline")
+    p_rodar.add_argument('--tolerancia', type=float, default=TOLERANCIA_PADRAO, help="piora relativa aceita antes de acusar regressão")
+    p_rodar.add_argument('--saida', help="arquivo JSON para o resultado completo")
+
+    args = parser.parse_args()
+    if args.comando == 'semear':
+        semear(args.db, args.elevadores, args.meses, args.leituras_por_dia)
+        sys.exit(0)
+
+    processos = subir_servidores(args.db, args.api, args.dashboard) if args.subir else []
+    try:
+        resultados = rodar(args.api, args.dashboard, args.db, args.elevadores, args.taxa_hz, args.duracao_s, args.visualizadores,
+                           args.conexoes, args.chamadas_analise, tuple(args.fases.split(',')))
+    finally:
+        for processo in processos:
+            processo.terminate()
+
+    imprimir(resultados)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as arquivo:
+            json.dump(resultados, arquivo, indent=2, ensure_ascii=False)
+
+    if args.salvar_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as arquivo:
+            json.dump(resultados, arquivo, indent=2, ensure_ascii=False)
+        print(f"Baseline salva em {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as arquivo:
+            regressoes = comparar(resultados, json.load(arquivo), args.tolerancia)
+        if regressoes:
+            print("Regressões em relação à baseline:")
+            for regressao in regressoes:
+                print(f"  - {regressao}")
+            sys.exit(1)
+        print("Sem regressões em relação à baseline.")
@@ -0,0 +1,156 @@
+import json
+import queue
+import socket
+import threading
+import time
+
+ENDERECO_PADRAO = ('127.0.0.1', 5002)
+
+def interpretar_endereco(valor):
+    host, _, porta = (valor or '').rpartition(':')
+    if not porta:
+        return ENDERECO_PADRAO
+    return (host or ENDERECO_PADRAO[0], int(porta))
+
+class ConexaoWorker:
+    def __init__(self, sock, max_fila):
+        self.sock = sock
+        self.fila = queue.Queue(maxsize=max_fila)
+        self.ativa = True
+
+class BrokerLocal:
+    def __init__(self, endereco=ENDERECO_PADRAO, max_fila=10000):
+        self.endereco = endereco
+        self.max_fila = max_fila
+        self._conexoes = set()
+        self._lock = threading.Lock()
+        self.contadores = {'mensagens_recebidas': 0, 'mensagens_entregues': 0, 'mensagens_descartadas': 0}
+
+    def servir(self):
+        servidor = socket.create_server(self.endereco)
+        print(f"Broker local ouvindo em {self.endereco[0]}:{self.endereco[1]}")
+        while True:
+            sock, _ = servidor.accept()
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conexao = ConexaoWorker(sock, self.max_fila)
+            with self._lock:
+                self._conexoes.add(conexao)
+            threading.Thread(target=self._ler, args=(conexao,), daemon=True).start()
+            threading.Thread(target=self._escrever, args=(conexao,), daemon=True).start()
+
+    def _ler(self, conexao):
+        try:
+            for linha in conexao.sock.makefile('rb'):
+                self.contadores['mensagens_recebidas'] += 1
+                with self._lock:
+                    destinos = [c for c in self._conexoes if c is not conexao]
+                for destino in destinos:
+                    try:
+                        destino.fila.put_nowait(linha)
+                    except queue.Full:
+                        self.contadores['mensagens_descartadas'] += 1
+        except OSError:
+            pass
+        finally:
+            self._remover(conexao)
+
+    def _escrever(self, conexao):
+        try:
+            while conexao.ativa:
+                try:
+                    linha = conexao.fila.get(timeout=1.0)
+                except queue.Empty:
+                    continue
+                conexao.sock.sendall(linha)
+                self.contadores['mensagens_entregues'] += 1
+        except OSError:
+            pass
+        finally:
+            self._remover(conexao)
+
+    def _remover(self, conexao):
+        with self._lock:
+            self._conexoes.discard(conexao)
+        if conexao.ativa:
+            conexao.ativa = False
+            try:
+                conexao.sock.close()
+            except OSError:
+                pass
+
+def servir(endereco=ENDERECO_PADRAO):
+    BrokerLocal(endereco).servir()
+
+class ClienteBroker:
+    def __init__(self, endereco, ao_receber, max_fila=10000, intervalo_reconexao_s=1.0):
+        self.endereco = endereco
+        self.ao_receber = ao_receber
+        self.intervalo_reconexao_s = intervalo_reconexao_s
+        self._fila = queue.Queue(maxsize=max_fila)
+        self._thread = None
+        self.conectado = False
+        self.contadores = {'publicadas': 0, 'recebidas': 0, 'descartadas': 0, 'conexoes': 0}
+
+    def iniciar(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='cliente-broker', daemon=True)
+            self._thread.start()
+
+    def publicar(self, mensagem):
+        try:
+            self._fila.put_nowait(json.dumps(mensagem).encode('utf-8') + b'\n')
+        except queue.Full:
+            self.contadores['descartadas'] += 1
+            return False
+        self.contadores['publicadas'] += 1
+        return True
+
+    def _loop(self):
+        while True:
+            try:
+                sock = socket.create_connection(self.endereco, timeout=2.0)
+            except OSError:
+                time.sleep(self.intervalo_reconexao_s)
+                continue
+            sock.settimeout(None)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.conectado = True
+            self.contadores['conexoes'] += 1
+            leitor = threading.Thread(target=self._ler, args=(sock,), name='cliente-broker-leitor', daemon=True)
+            leitor.start()
+            try:
+                while leitor.is_alive():
+                    try:
+                        linha = self._fila.get(timeout=1.0)
+                    except queue.Empty:
+                        continue
+                    sock.sendall(linha)
+            except OSError as e:
+                print(f"Conexão com o broker local perdida: {e}")
+            finally:
+                self.conectado = False
+                try:
+                    sock.close()
+                except OSError:
+                    pass
+
+    def _ler(self, sock):
+        try:
+            for linha in sock.makefile('rb'):
+                self.contadores['recebidas'] += 1
+                try:
+                    self.ao_receber(json.loads(linha))
+                except Exception as e:
+                    print(f"Erro ao processar mensagem do broker: {e}")
+        except OSError:
+            pass
+
+    def metricas(self):
+        metricas = dict(self.contadores)
+        metricas['conectado'] = self.conectado
+        metricas['profundidade_fila'] = self._fila.qsize()
+        return metricas
+
+if __name__ == '__main__':
+    import sys
+    servir(interpretar_endereco(sys.argv[1] if len(sys.argv) > 1 else None))
@@ -0,0 +1,78 @@
+import collections
+import hashlib
+import os
+import threading
+import time
+from flask import Response, current_app, request
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+DIRETORIO_VERSOES = os.path.join(basedir, 'cache')
+
+class CacheRespostas:
+    def __init__(self, diretorio=DIRETORIO_VERSOES, capacidade=4096):
+        self.diretorio = diretorio
+        self.capacidade = capacidade
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.contadores = {'acertos': 0, 'montadas': 0, 'nao_modificadas': 0, 'invalidacoes': 0}
+
+    def caminho(self, tecnico_id):
+        return os.path.join(self.diretorio, hashlib.sha1(str(tecnico_id).encode('utf-8')).hexdigest() + '.versao')
+
+    def versao(self, tecnico_id):
+        try:
+            estado = os.stat(self.caminho(tecnico_id))
+        except FileNotFoundError:
+            return (0, 0), None
+        return (estado.st_ino, estado.st_mtime_ns), estado.st_mtime
+
+    def invalidar(self, tecnico_id):
+        os.makedirs(self.diretorio, exist_ok=True)
+        caminho = self.caminho(tecnico_id)
+        temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporario, 'w') as arquivo:
+            arquivo.write(str(time.time()))
+        os.replace(temporario, caminho)
+        with self._lock:
+            for chave in [c for c in self._cache if c[0] == tecnico_id]:
+                del self._cache[chave]
+        self.contadores['invalidacoes'] += 1
+
+    def responder(self, tecnico_id, chave, montar):
+        versao, modificado_em = self.versao(tecnico_id)
+        with self._lock:
+            entrada = self._cache.get((tecnico_id, chave))
+            if entrada is not None and entrada[0] == versao:
+                self._cache.move_to_end((tecnico_id, chave))
+                self.contadores['acertos'] += 1
+            else:
+                entrada = None
+
+        if entrada is None:
+            dados = montar()
+            if isinstance(dados, tuple):
+                return dados
+            corpo = current_app.json.dumps(dados).encode('utf-8')
+            entrada = (versao, corpo, hashlib.blake2b(corpo, digest_size=16).hexdigest(), modificado_em or time.time())
+            self.contadores['montadas'] += 1
+            with self._lock:
+                self._cache[(tecnico_id, chave)] = entrada
+                self._cache.move_to_end((tecnico_id, chave))
+                while len(self._cache) > self.capacidade:
+                    self._cache.popitem(last=False)
+
+        resposta = Response(entrada[1], mimetype='application/json')
+        resposta.set_etag(entrada[2])
+        resposta.last_modified = entrada[3]
+        resposta.headers['Cache-Control'] = 'private, no-cache'
+        resposta = resposta.make_conditional(request)
+        if resposta.status_code == 304:
+            self.contadores['nao_modificadas'] += 1
+        return resposta
+
+    def metricas(self):
+        metricas = dict(self.contadores)
+        metricas['entradas'] = len(self._cache)
+        return metricas
+
+cache_respostas = CacheRespostas()
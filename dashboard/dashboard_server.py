@@ -1,12 +1,57 @@
+import os
 import json
+import time
 import requests
 from flask import Flask, render_template, request, jsonify, send_from_directory
 from flask_sock import Sock
 from datetime import datetime
+from encaminhador import Encaminhador, API_URL
+from difusor import Difusor
+from detector_anomalias import DetectorAnomalias
+from broker_local import ClienteBroker, interpretar_endereco
+import formato_binario
+from instrumentacao import telemetria, metricas_bp
 
 app = Flask(__name__)
 sock = Sock(app)
-connected_clients = set()
+app.register_blueprint(metricas_bp)
+
+def elevadores_do_predio(predio):
+    try:
+        resposta = requests.get(f"{API_URL}/api/predios/elevadores", params={'predio': predio}, timeout=2)
+        resposta.raise_for_status()
+        return resposta.json().get('elevadores', [])
+    except (requests.exceptions.RequestException, ValueError) as e:
+        print(f"Erro ao consultar elevadores do prédio '{predio}': {e}")
+        return []
+
+PIPELINE_UNIFICADO = os.environ.get('ASCENSUS_PIPELINE') == 'unificado'
+
+if PIPELINE_UNIFICADO:
+    import pipeline
+    difusor = Difusor(resolver_predio=pipeline.elevadores_do_predio)
+    encaminhador_leituras = pipeline.EtapaPersistencia('leituras', pipeline.gravar_leituras)
+    encaminhador_eventos = pipeline.EtapaPersistencia('eventos', pipeline.gravar_eventos)
+else:
+    difusor = Difusor(resolver_predio=elevadores_do_predio)
+    encaminhador_leituras = Encaminhador(f"{API_URL}/api/log_sensor/batch", 'leituras')
+    encaminhador_eventos = Encaminhador(f"{API_URL}/api/eventos_anomalia/batch", 'eventos', chave='eventos')
+detector = DetectorAnomalias(elevador_conhecido=pipeline.elevador_existe if PIPELINE_UNIFICADO else None)
+
+def distribuir(dados_limpos, elevador_id, local=True):
+    difusor.publicar(json.dumps(dados_limpos), elevador_id, dados_limpos)
+    for alerta in detector.processar(elevador_id, dados_limpos):
+        difusor.publicar_evento(json.dumps(alerta), elevador_id)
+        if local:
+            encaminhador_eventos.enfileirar(alerta)
+
+def receber_do_broker(mensagem):
+    distribuir(mensagem['leitura'], mensagem.get('elevador_id'), local=False)
+
+broker = None
+if os.environ.get('ASCENSUS_BROKER'):
+    broker = ClienteBroker(interpretar_endereco(os.environ['ASCENSUS_BROKER']), receber_do_broker)
+    broker.iniciar()
 
 @app.route('/')
 def index():
@@ -15,16 +60,15 @@ def index():
 @sock.route('/ws/Bunny&Buddy')
 def ws_bunny_buddy(ws):
     print("Dashboard conectado!")
-    connected_clients.add(ws) 
-    try:
-        while True:
-            ws.receive(timeout=10) 
-    except Exception:
-        print("Dashboard desconectado.")
-        connected_clients.discard(ws)
+    elevadores = [e for e in request.args.get('elevadores', '').split(',') if e]
+    difusor.servir(ws, elevadores, request.args.get('predio'),
+                   request.args.get('modo'), request.args.get('janela'), request.args.get('campo'),
+                   request.args.get('protocolo'), request.args.get('compressao'))
+    print("Dashboard desconectado.")
 
 @app.route('/api/sensor', methods=['POST'])
 def receive_sensor_data():
+    inicio = time.perf_counter()
     dados_brutos = request.json 
     if not dados_brutos:
         return jsonify({"status": "error", "message": "Nenhum dado recebido"}), 400
@@ -45,6 +89,12 @@ def receive_sensor_data():
         except (ValueError, TypeError):
             return default
 
+    def get_id_elevador():
+        val = dados_brutos.get('id_elevador')
+        if isinstance(val, int) and not isinstance(val, bool):
+            return str(val)
+        return val if isinstance(val, str) else None
+
     dados_limpos = {
         't': int(datetime.now().timestamp() * 1000),
         'ia': get_float('ia'),
@@ -56,7 +106,8 @@ def receive_sensor_data():
         'dist_l2': get_float('dist_l2', 200),
         'dist_o1': get_float('dist_o1', 200),
         'dist_o2': get_float('dist_o2', 200),
-        'altura': dados_brutos.get('altura')
+        'altura': dados_brutos.get('altura'),
+        'id_elevador': get_id_elevador()
     }
 
     tensao_bruta = dados_brutos.get('tensao')
@@ -67,28 +118,59 @@ def receive_sensor_data():
         tensao_calculada = dados_limpos['ia'] * 2.0 
         dados_limpos['tensao'] = max(0.0, min(20.0, tensao_calculada))
 
-    id_elevador_vindo_do_hardware = dados_brutos.get('id_elevador')
+    telemetria.observar('sensor_parse_limpeza', inicio)
+    processar_leitura(dados_limpos)
+
+    return jsonify({"status": "success", "message": "Dados tratados e retransmitidos"}), 200
+
+def processar_leitura(dados_limpos):
+    id_elevador_vindo_do_hardware = dados_limpos['id_elevador']
     
     if id_elevador_vindo_do_hardware:
-        try:
-            requests.post(
-                f"http://127.0.0.1:5001/api/log_sensor/{id_elevador_vindo_do_hardware}",
-                json=dados_limpos,
-                timeout=0.5
-            )
-        except requests.exceptions.RequestException as e:
-            print(f"Erro ao logar dados para API: {e}")
-    
-    json_data_string = json.dumps(dados_limpos)
+        encaminhador_leituras.enfileirar(dict(dados_limpos, elevador_id=id_elevador_vindo_do_hardware))
     
-    for client_ws in list(connected_clients):
-        try:
-            client_ws.send(json_data_string)
-        except Exception as e:
-            print(f"Erro ao enviar, removendo cliente: {e}")
-            connected_clients.discard(client_ws)
+    if broker:
+        broker.publicar({'elevador_id': id_elevador_vindo_do_hardware, 'leitura': dados_limpos})
+    distribuir(dados_limpos, id_elevador_vindo_do_hardware)
 
-    return jsonify({"status": "success", "message": "Dados tratados e retransmitidos"}), 200
+@app.route('/api/sensor/bin', methods=['POST'])
+def receive_sensor_data_binario():
+    inicio = time.perf_counter()
+    try:
+        elevador_id, registros = formato_binario.decodificar(request.get_data(cache=False))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    telemetria.observar('sensor_bin_decodificacao', inicio)
+    if not registros:
+        return jsonify({"status": "error", "message": "Nenhum dado recebido"}), 400
+
+    agora_ms = int(datetime.now().timestamp() * 1000)
+    for registro in registros:
+        processar_leitura(formato_binario.leitura_limpa(registro, agora_ms, elevador_id))
+
+    return jsonify({"status": "success", "registros": len(registros)}), 200
+
+@app.route('/api/sensor/bin/formato', methods=['GET'])
+def get_formato_binario():
+    return jsonify(formato_binario.descrever())
+
+@app.route('/api/encaminhador/metricas', methods=['GET'])
+def get_metricas_encaminhador():
+    return jsonify(encaminhador_leituras.metricas())
+
+@app.route('/api/difusor/metricas', methods=['GET'])
+def get_metricas_difusor():
+    metricas = difusor.metricas()
+    metricas['pid'] = os.getpid()
+    if broker:
+        metricas['broker'] = broker.metricas()
+    return jsonify(metricas)
+
+@app.route('/api/detector/metricas', methods=['GET'])
+def get_metricas_detector():
+    metricas = detector.metricas()
+    metricas['encaminhador_eventos'] = encaminhador_eventos.metricas()
+    return jsonify(metricas)
 
 @app.route('/brand/<path:filename>')
 def custom_static(filename):
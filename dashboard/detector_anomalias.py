@@ -0,0 +1,127 @@
+import collections
+import math
+import threading
+import time
+
+CAMPOS_DETECTOR = ['ia', 'temp_c', 'vib_s1_ms2']
+ALFA_EWMA = 0.01
+LIMIAR_Z = 5.0
+QUANTIL = 0.99
+PASSO_QUANTIL = 0.1
+MARGEM_QUANTIL = 1.5
+AQUECIMENTO = 200
+HISTERESE = 0.5
+MAX_ELEVADORES = 10000
+TTL_OCIOSO_S = 3600.0
+
+class EstadoCampo:
+    __slots__ = ('n', 'media', 'variancia', 'quantil', 'alerta_z', 'alerta_quantil')
+
+    def __init__(self, valor):
+        self.n = 1
+        self.media = valor
+        self.variancia = 0.0
+        self.quantil = valor
+        self.alerta_z = False
+        self.alerta_quantil = False
+
+    def atualizar(self, valor):
+        desvio = math.sqrt(self.variancia)
+        z = abs(valor - self.media) / desvio if desvio > 0 else 0.0
+        limite_quantil = self.quantil + MARGEM_QUANTIL * desvio if desvio > 0 else math.inf
+
+        diferenca = valor - self.media
+        incremento = ALFA_EWMA * diferenca
+        self.media += incremento
+        self.variancia = (1 - ALFA_EWMA) * (self.variancia + diferenca * incremento)
+        self.quantil += PASSO_QUANTIL * desvio * (QUANTIL - (valor <= self.quantil))
+        self.n += 1
+        return z, limite_quantil
+
+class DetectorAnomalias:
+    def __init__(self, campos=CAMPOS_DETECTOR, limiar_z=LIMIAR_Z, aquecimento=AQUECIMENTO,
+                 elevador_conhecido=None, max_elevadores=MAX_ELEVADORES, ttl_ocioso_s=TTL_OCIOSO_S):
+        self.campos = campos
+        self.limiar_z = limiar_z
+        self.aquecimento = aquecimento
+        self.elevador_conhecido = elevador_conhecido
+        self.max_elevadores = max_elevadores
+        self.ttl_ocioso_s = ttl_ocioso_s
+        self._estados = collections.OrderedDict()
+        self._vistos = {}
+        self._lock = threading.Lock()
+        self.contadores = {'leituras_avaliadas': 0, 'alertas_z': 0, 'alertas_quantil': 0,
+                           'elevadores_desconhecidos': 0, 'elevadores_expirados': 0}
+
+    def _expirar(self, agora):
+        while self._estados:
+            elevador_id = next(iter(self._estados))
+            if len(self._estados) <= self.max_elevadores and agora - self._vistos[elevador_id] < self.ttl_ocioso_s:
+                break
+            del self._estados[elevador_id]
+            del self._vistos[elevador_id]
+            self.contadores['elevadores_expirados'] += 1
+
+    def processar(self, elevador_id, leitura):
+        if not elevador_id or not isinstance(elevador_id, str):
+            return []
+        with self._lock:
+            novo = elevador_id not in self._estados
+        if novo and self.elevador_conhecido is not None and not self.elevador_conhecido(elevador_id):
+            self.contadores['elevadores_desconhecidos'] += 1
+            return []
+        alertas = []
+        agora = time.monotonic()
+        with self._lock:
+            self.contadores['leituras_avaliadas'] += 1
+            por_campo = self._estados.setdefault(elevador_id, {})
+            self._estados.move_to_end(elevador_id)
+            self._vistos[elevador_id] = agora
+            self._expirar(agora)
+            for campo in self.campos:
+                valor = leitura.get(campo)
+                if isinstance(valor, bool) or not isinstance(valor, (int, float)) or not math.isfinite(valor):
+                    continue
+                estado = por_campo.get(campo)
+                if estado is None:
+                    por_campo[campo] = EstadoCampo(float(valor))
+                    continue
+                referencia, desvio = estado.media, math.sqrt(estado.variancia)
+                z, limite_quantil = estado.atualizar(float(valor))
+                if estado.n <= self.aquecimento:
+                    continue
+
+                if not estado.alerta_z and z >= self.limiar_z:
+                    estado.alerta_z = True
+                    self.contadores['alertas_z'] += 1
+                    alertas.append(self._alerta(elevador_id, campo, 'zscore', valor, referencia, desvio, z,
+                                                referencia + self.limiar_z * desvio, leitura))
+                elif estado.alerta_z and z < self.limiar_z * HISTERESE:
+                    estado.alerta_z = False
+
+                if not estado.alerta_quantil and valor > limite_quantil:
+                    estado.alerta_quantil = True
+                    self.contadores['alertas_quantil'] += 1
+                    alertas.append(self._alerta(elevador_id, campo, 'quantil', valor, referencia, desvio, z,
+                                                limite_quantil, leitura))
+                elif estado.alerta_quantil and valor <= estado.quantil:
+                    estado.alerta_quantil = False
+        return alertas
+
+    def _alerta(self, elevador_id, campo, detector, valor, referencia, desvio, z, limite, leitura):
+        return {
+            'tipo': 'alerta', 'elevador_id': elevador_id, 'campo': campo, 'detector': detector,
+            'valor': float(valor), 'referencia': referencia, 'desvio': desvio, 'z': z, 'limite': limite,
+            't': leitura.get('t')
+        }
+
+    def esquecer(self, elevador_id):
+        with self._lock:
+            self._estados.pop(elevador_id, None)
+            self._vistos.pop(elevador_id, None)
+
+    def metricas(self):
+        with self._lock:
+            metricas = dict(self.contadores)
+            metricas['elevadores_monitorados'] = len(self._estados)
+        return metricas
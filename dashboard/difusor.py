@@ -0,0 +1,282 @@
+import collections
+import json
+import socket
+import threading
+import time
+from simple_websocket import ConnectionClosed
+from modos_stream import GerenciadorModos, normalizar_modo
+from protocolo_delta import CodificadorDelta, normalizar_protocolo
+from instrumentacao import telemetria
+
+class ClienteWs:
+    def __init__(self, ws, max_fila):
+        self.ws = ws
+        self.fila = collections.deque(maxlen=max_fila)
+        self.condicao = threading.Condition()
+        self.ativo = True
+        self.ultimo_progresso = time.monotonic()
+        self.descartados = 0
+        self.elevadores = None
+        self.elevadores_explicitos = None
+        self.predio = None
+        self.predio_resolvido_em = 0.0
+        self.modo = None
+        self.protocolo = None
+
+    def enfileirar(self, frame):
+        with self.condicao:
+            cheia = len(self.fila) == self.fila.maxlen
+            if cheia:
+                self.descartados += 1
+            elif not self.fila:
+                self.ultimo_progresso = time.monotonic()
+            self.fila.append(frame)
+            self.condicao.notify()
+        return cheia
+
+    def proximo(self, timeout):
+        with self.condicao:
+            if not self.fila and self.ativo:
+                self.condicao.wait(timeout)
+            if not self.ativo or not self.fila:
+                return None
+            return self.fila.popleft()
+
+    def drenar_leituras(self, maximo):
+        frames = []
+        with self.condicao:
+            while self.fila and len(frames) < maximo and self.fila[0][2] is not None:
+                frames.append(self.fila.popleft())
+        return frames
+
+    def encerrar(self):
+        with self.condicao:
+            self.ativo = False
+            self.fila.clear()
+            self.condicao.notify()
+
+    def derrubar_conexao(self):
+        try:
+            self.ws.sock.shutdown(socket.SHUT_RDWR)
+        except (AttributeError, OSError):
+            pass
+
+class Difusor:
+    def __init__(self, resolver_predio=None, max_fila_cliente=64, limite_travado_s=10.0, intervalo_receive_s=1.0,
+                 amostras_lag=1024, validade_predio_s=60.0, intervalo_expiracao_s=0.25, max_lote_binario=64):
+        self.resolver_predio = resolver_predio
+        self.validade_predio_s = validade_predio_s
+        self.max_fila_cliente = max_fila_cliente
+        self.limite_travado_s = limite_travado_s
+        self.intervalo_receive_s = intervalo_receive_s
+        self.max_lote_binario = max_lote_binario
+        self._clientes = set()
+        self._todos = set()
+        self._por_elevador = {}
+        self._lock = threading.Lock()
+        self._lags_ms = collections.deque(maxlen=amostras_lag)
+        self.modos = GerenciadorModos()
+        self.intervalo_expiracao_s = intervalo_expiracao_s
+        self._thread_expiracao = None
+        self.contadores = {
+            'frames_publicados': 0,
+            'frames_roteados': 0,
+            'frames_enviados': 0,
+            'frames_descartados': 0,
+            'clientes_despejados': 0,
+            'erros_envio': 0,
+            'bytes_delta_brutos': 0,
+            'bytes_delta_enviados': 0
+        }
+
+    def publicar(self, texto, elevador_id=None, leitura=None):
+        frame = (time.monotonic(), texto, leitura)
+        with self._lock:
+            clientes = self._destinos(elevador_id)
+            self.contadores['frames_publicados'] += 1
+        self._entregar([c for c in clientes if c.modo is None], frame)
+
+        if leitura is not None and self.modos.tem_ativos():
+            self._entregar_modos(self.modos.processar(leitura, elevador_id))
+
+    def publicar_evento(self, texto, elevador_id=None):
+        frame = (time.monotonic(), texto, None)
+        with self._lock:
+            clientes = self._destinos(elevador_id)
+            self.contadores['frames_publicados'] += 1
+        self._entregar(clientes, frame)
+
+    def _destinos(self, elevador_id):
+        clientes = list(self._todos)
+        clientes.extend(self._por_elevador.get(elevador_id, ()))
+        return clientes
+
+    def _entregar(self, clientes, frame):
+        self.contadores['frames_roteados'] += len(clientes)
+        agora = frame[0]
+        for cliente in clientes:
+            if cliente.enfileirar(frame):
+                self.contadores['frames_descartados'] += 1
+                if agora - cliente.ultimo_progresso > self.limite_travado_s:
+                    print("Dashboard travado, removendo cliente.")
+                    self.contadores['clientes_despejados'] += 1
+                    self._remover(cliente)
+                    cliente.derrubar_conexao()
+
+    def _entregar_modos(self, frames):
+        for chave, elevador_id, dados in frames:
+            with self._lock:
+                clientes = [c for c in self._destinos(elevador_id) if c.modo == chave]
+            if clientes:
+                self._entregar(clientes, (time.monotonic(), json.dumps(dados), None))
+
+    def _loop_expiracao(self):
+        while True:
+            time.sleep(self.intervalo_expiracao_s)
+            if self.modos.tem_ativos():
+                self._entregar_modos(self.modos.expirar(int(time.time() * 1000)))
+
+    def definir_modo(self, cliente, modo=None, janela=None, campo=None):
+        chave = normalizar_modo(modo, janela, campo)
+        if chave == cliente.modo:
+            return
+        if chave is not None:
+            self.modos.ativar(chave)
+            with self._lock:
+                if self._thread_expiracao is None:
+                    self._thread_expiracao = threading.Thread(target=self._loop_expiracao, name='difusor-expiracao', daemon=True)
+                    self._thread_expiracao.start()
+        if cliente.modo is not None:
+            self.modos.desativar(cliente.modo)
+        cliente.modo = chave
+
+    def definir_protocolo(self, cliente, protocolo=None, compressao=None):
+        chave = normalizar_protocolo(protocolo, compressao)
+        atual = (cliente.protocolo and ('delta', cliente.protocolo.compressao))
+        if chave == atual:
+            return
+        cliente.protocolo = CodificadorDelta(chave[1]) if chave else None
+        cliente.ws.send(json.dumps(cliente.protocolo.esquema() if chave else {'tipo': 'esquema', 'protocolo': 'json'}))
+
+    def assinar(self, cliente, elevadores=None, predio=None):
+        ids = {str(e) for e in elevadores or [] if e}
+        if predio and self.resolver_predio:
+            ids.update(self.resolver_predio(predio))
+        cliente.elevadores_explicitos = elevadores
+        cliente.predio = predio or None
+        cliente.predio_resolvido_em = time.monotonic()
+
+        with self._lock:
+            self._desindexar(cliente)
+            cliente.elevadores = ids if (elevadores or predio) else None
+            if cliente.ativo:
+                self._indexar(cliente)
+
+    def _indexar(self, cliente):
+        self._clientes.add(cliente)
+        if cliente.elevadores is None:
+            self._todos.add(cliente)
+            return
+        for elevador_id in cliente.elevadores:
+            self._por_elevador.setdefault(elevador_id, set()).add(cliente)
+
+    def _desindexar(self, cliente):
+        self._clientes.discard(cliente)
+        self._todos.discard(cliente)
+        for elevador_id in cliente.elevadores or ():
+            assinantes = self._por_elevador.get(elevador_id)
+            if assinantes is not None:
+                assinantes.discard(cliente)
+                if not assinantes:
+                    del self._por_elevador[elevador_id]
+
+    def servir(self, ws, elevadores=None, predio=None, modo=None, janela=None, campo=None, protocolo=None, compressao=None):
+        cliente = ClienteWs(ws, self.max_fila_cliente)
+        self.definir_protocolo(cliente, protocolo, compressao)
+        self.definir_modo(cliente, modo, janela, campo)
+        self.assinar(cliente, elevadores, predio)
+        ultima_leitura = time.monotonic()
+        try:
+            while cliente.ativo:
+                frame = cliente.proximo(self.intervalo_receive_s)
+                if frame is not None:
+                    inicio_envio = time.perf_counter()
+                    enviados = self._enviar(cliente, frame)
+                    telemetria.observar('ws_envio', inicio_envio)
+                    cliente.ultimo_progresso = time.monotonic()
+                    self._lags_ms.append((cliente.ultimo_progresso - frame[0]) * 1000.0)
+                    self.contadores['frames_enviados'] += enviados
+                if frame is None or time.monotonic() - ultima_leitura >= self.intervalo_receive_s:
+                    self._ler_mensagens(cliente)
+                    ultima_leitura = time.monotonic()
+                if cliente.predio and ultima_leitura - cliente.predio_resolvido_em >= self.validade_predio_s:
+                    self.assinar(cliente, cliente.elevadores_explicitos, cliente.predio)
+        except ConnectionClosed:
+            pass
+        except Exception as e:
+            if cliente.ativo:
+                self.contadores['erros_envio'] += 1
+                print(f"Erro no envio para dashboard: {e}")
+        finally:
+            self._remover(cliente)
+
+    def _enviar(self, cliente, frame):
+        codificador = cliente.protocolo
+        if codificador is None or frame[2] is None:
+            cliente.ws.send(frame[1])
+            return 1
+        frames = [frame] + cliente.drenar_leituras(self.max_lote_binario - 1)
+        saida = bytearray()
+        for _, _, leitura in frames:
+            codificador.codificar(leitura, saida)
+        brutos = len(saida)
+        saida = codificador.finalizar(saida)
+        cliente.ws.send(saida)
+        self.contadores['bytes_delta_brutos'] += brutos
+        self.contadores['bytes_delta_enviados'] += len(saida)
+        return len(frames)
+
+    def _ler_mensagens(self, cliente):
+        mensagem = cliente.ws.receive(timeout=0)
+        while mensagem is not None:
+            self._processar_mensagem(cliente, mensagem)
+            mensagem = cliente.ws.receive(timeout=0)
+
+    def _processar_mensagem(self, cliente, mensagem):
+        try:
+            dados = json.loads(mensagem)
+        except (TypeError, ValueError):
+            return
+        if isinstance(dados, dict) and 'assinar' in dados:
+            filtro = dados['assinar'] if isinstance(dados['assinar'], dict) else {}
+            elevadores = filtro.get('elevadores')
+            if isinstance(elevadores, str):
+                elevadores = [elevadores]
+            self.assinar(cliente, elevadores if isinstance(elevadores, list) else None, filtro.get('predio'))
+        if isinstance(dados, dict) and isinstance(dados.get('protocolo'), dict):
+            protocolo = dados['protocolo']
+            self.definir_protocolo(cliente, protocolo.get('tipo'), protocolo.get('compressao'))
+        if isinstance(dados, dict) and isinstance(dados.get('modo'), dict):
+            modo = dados['modo']
+            self.definir_modo(cliente, modo.get('tipo'), modo.get('janela'), modo.get('campo'))
+
+    def _remover(self, cliente):
+        with self._lock:
+            self._desindexar(cliente)
+        if cliente.ativo:
+            self.definir_modo(cliente, None)
+        cliente.encerrar()
+
+    def metricas(self):
+        with self._lock:
+            metricas = dict(self.contadores)
+            metricas['clientes_conectados'] = len(self._clientes)
+            metricas['clientes_sem_filtro'] = len(self._todos)
+            metricas['elevadores_assinados'] = len(self._por_elevador)
+            metricas['fila_max_clientes'] = max((len(c.fila) for c in self._clientes), default=0)
+        lags = sorted(self._lags_ms)
+        if lags:
+            metricas['lag_p50_ms'] = lags[len(lags) // 2]
+            metricas['lag_p99_ms'] = lags[min(len(lags) - 1, int(len(lags) * 0.99))]
+            metricas['lag_max_ms'] = lags[-1]
+        return metricas
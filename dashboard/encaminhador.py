@@ -0,0 +1,246 @@
+import atexit
+import contextlib
+import json
+import os
+import queue
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from instrumentacao import telemetria
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+API_URL = "http://127.0.0.1:5001"
+PASTA_SPOOL = os.path.join(basedir, 'spool')
+
+class Encaminhador:
+    def __init__(self, url, nome, chave='leituras', max_fila=10000, max_lote=200, intervalo_s=0.2,
+                 timeout_s=2.0, backoff_inicial_s=0.5, backoff_max_s=30.0, max_lotes_reenvio=20):
+        self.url = url
+        self.nome = nome
+        self.chave = chave
+        self.max_lote = max_lote
+        self.intervalo_s = intervalo_s
+        self.timeout_s = timeout_s
+        self.backoff_inicial_s = backoff_inicial_s
+        self.backoff_max_s = backoff_max_s
+        self.max_lotes_reenvio = max_lotes_reenvio
+        self.arquivo_spool = os.path.join(PASTA_SPOOL, f"{nome}.jsonl")
+        self.arquivo_reenvio = self.arquivo_spool + '.reenvio'
+        self.arquivo_posicao = self.arquivo_reenvio + '.posicao'
+        self.arquivo_invalidas = self.arquivo_spool + '.invalidas'
+        self.arquivo_trava_spool = self.arquivo_spool + '.lock'
+        self.arquivo_trava_reenvio = self.arquivo_reenvio + '.lock'
+
+        self._fila = queue.Queue(maxsize=max_fila)
+        self._lock = threading.Lock()
+        self._lock_spool = threading.Lock()
+        self._thread = None
+        self._sessao = None
+        self._backoff_s = 0.0
+        self._indisponivel_ate = 0.0
+        self.contadores = {
+            'enfileirados': 0,
+            'descartados_fila_cheia': 0,
+            'enviados': 0,
+            'rejeitados_api': 0,
+            'lotes_enviados': 0,
+            'falhas_envio': 0,
+            'gravados_spool': 0,
+            'reenviados_spool': 0,
+            'linhas_invalidas_spool': 0,
+            'erros_loop': 0,
+            'ultima_latencia_ms': 0.0
+        }
+
+    def iniciar(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._sessao = requests.Session()
+            adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0)
+            self._sessao.mount('http://', adaptador)
+            self._sessao.mount('https://', adaptador)
+            self._thread = threading.Thread(target=self._loop, name=f"encaminhador-{self.nome}", daemon=True)
+            self._thread.start()
+            atexit.register(self.encerrar)
+
+    def enfileirar(self, item):
+        if self._thread is None:
+            self.iniciar()
+        try:
+            self._fila.put_nowait(item)
+        except queue.Full:
+            self.contadores['descartados_fila_cheia'] += 1
+            return False
+        self.contadores['enfileirados'] += 1
+        return True
+
+    def _coletar_lote(self):
+        try:
+            lote = [self._fila.get(timeout=self.intervalo_s)]
+        except queue.Empty:
+            return []
+        limite = time.monotonic() + self.intervalo_s
+        while len(lote) < self.max_lote:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                lote.append(self._fila.get(timeout=restante))
+            except queue.Empty:
+                break
+        return lote
+
+    def _loop(self):
+        while True:
+            try:
+                self._ciclo()
+            except Exception as e:
+                self.contadores['erros_loop'] += 1
+                print(f"Erro no encaminhador '{self.nome}': {e}")
+                time.sleep(self.backoff_inicial_s)
+
+    def _ciclo(self):
+        lote = self._coletar_lote()
+        if lote and not self._enviar(lote):
+            self._gravar_spool(lote)
+        if self._api_disponivel() and (os.path.exists(self.arquivo_reenvio) or os.path.exists(self.arquivo_spool)):
+            self._reenviar_spool()
+
+    def _api_disponivel(self):
+        return time.monotonic() >= self._indisponivel_ate
+
+    def _enviar(self, lote):
+        if not self._api_disponivel():
+            return False
+
+        inicio = time.perf_counter()
+        try:
+            resposta = self._sessao.post(self.url, json={self.chave: lote}, timeout=self.timeout_s)
+        except requests.exceptions.RequestException as e:
+            telemetria.observar(f"encaminhar_{self.nome}", inicio)
+            telemetria.contar(f"encaminhar_{self.nome}_falhas")
+            self._registrar_falha(f"Erro ao encaminhar {len(lote)} itens para API: {e}")
+            return False
+        telemetria.observar(f"encaminhar_{self.nome}", inicio)
+
+        if resposta.status_code >= 500:
+            telemetria.contar(f"encaminhar_{self.nome}_falhas")
+            self._registrar_falha(f"API respondeu {resposta.status_code} ao encaminhar {len(lote)} itens")
+            return False
+
+        self.contadores['ultima_latencia_ms'] = (time.perf_counter() - inicio) * 1000.0
+        self.contadores['lotes_enviados'] += 1
+        self._backoff_s = 0.0
+        try:
+            rejeitados = resposta.json().get('rejeitadas', 0) if resposta.status_code < 400 else len(lote)
+        except ValueError:
+            rejeitados = 0
+        self.contadores['enviados'] += len(lote) - rejeitados
+        self.contadores['rejeitados_api'] += rejeitados
+        return True
+
+    def _registrar_falha(self, mensagem):
+        self.contadores['falhas_envio'] += 1
+        self._backoff_s = min(self.backoff_max_s, max(self.backoff_inicial_s, self._backoff_s * 2))
+        self._indisponivel_ate = time.monotonic() + self._backoff_s
+        print(f"{mensagem} (nova tentativa em {self._backoff_s:.1f}s)")
+
+    @contextlib.contextmanager
+    def _travar(self, caminho, bloquear=True):
+        os.makedirs(PASTA_SPOOL, exist_ok=True)
+        with open(caminho, 'a') as trava:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(trava, fcntl.LOCK_EX if bloquear else fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    yield False
+                    return
+            yield True
+
+    def _gravar_spool(self, lote):
+        with self._lock_spool, self._travar(self.arquivo_trava_spool):
+            with open(self.arquivo_spool, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(lote) + '\n')
+        self.contadores['gravados_spool'] += len(lote)
+
+    def _ler_posicao(self):
+        try:
+            with open(self.arquivo_posicao, encoding='utf-8') as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _salvar_posicao(self, posicao):
+        temporario = f"{self.arquivo_posicao}.{os.getpid()}.tmp"
+        with open(temporario, 'w', encoding='utf-8') as f:
+            f.write(str(posicao))
+        os.replace(temporario, self.arquivo_posicao)
+
+    def _ler_lote(self, linha):
+        if not linha.strip():
+            return []
+        try:
+            lote = json.loads(linha)
+        except json.JSONDecodeError:
+            lote = None
+        if isinstance(lote, list):
+            return lote
+        with open(self.arquivo_invalidas, 'a', encoding='utf-8') as f:
+            f.write(linha if linha.endswith('\n') else linha + '\n')
+        self.contadores['linhas_invalidas_spool'] += 1
+        print(f"Linha inválida no spool '{self.nome}' movida para {self.arquivo_invalidas}")
+        return []
+
+    def _reenviar_spool(self):
+        with self._travar(self.arquivo_trava_reenvio, bloquear=False) as obtida:
+            if not obtida:
+                return
+            if os.path.exists(self.arquivo_reenvio):
+                posicao = self._ler_posicao()
+            else:
+                with self._lock_spool, self._travar(self.arquivo_trava_spool):
+                    if not os.path.exists(self.arquivo_spool):
+                        return
+                    self._salvar_posicao(0)
+                    os.replace(self.arquivo_spool, self.arquivo_reenvio)
+                posicao = 0
+            with open(self.arquivo_reenvio, encoding='utf-8') as f:
+                f.seek(posicao)
+                for _ in range(self.max_lotes_reenvio):
+                    linha = f.readline()
+                    if not linha:
+                        break
+                    lote = self._ler_lote(linha)
+                    if lote and not self._enviar(lote):
+                        return
+                    self._salvar_posicao(f.tell())
+                    self.contadores['reenviados_spool'] += len(lote)
+                else:
+                    return
+            os.remove(self.arquivo_reenvio)
+            os.remove(self.arquivo_posicao)
+        print(f"Spool '{self.nome}' reenviado para a API.")
+
+    def encerrar(self):
+        pendentes = []
+        while True:
+            try:
+                pendentes.append(self._fila.get_nowait())
+            except queue.Empty:
+                break
+        if pendentes:
+            self._gravar_spool(pendentes)
+
+    def metricas(self):
+        metricas = dict(self.contadores)
+        metricas['profundidade_fila'] = self._fila.qsize()
+        metricas['api_disponivel'] = self._api_disponivel()
+        metricas['backoff_s'] = self._backoff_s
+        return metricas
@@ -0,0 +1,232 @@
+import json
+import math
+from datetime import datetime
+from sqlalchemy import text, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import EstatisticaSensor
+import particoes
+
+CAMPOS_ESTATISTICA = ['ia', 'temp_c', 'vib_s1_ms2', 'tensao']
+QUANTIL_MEDIANA = 0.5
+
+tabela = EstatisticaSensor.__table__
+
+class QuantilP2:
+    def __init__(self, p=QUANTIL_MEDIANA):
+        self.p = p
+        self.iniciais = []
+        self.q = None
+        self.n = None
+        self.np = None
+        self.dn = [0.0, p / 2, p, (1 + p) / 2, 1.0]
+
+    @classmethod
+    def de_marcadores(cls, alturas, posicoes, total, p=QUANTIL_MEDIANA):
+        quantil = cls(p)
+        quantil.q = list(alturas)
+        quantil.n = list(posicoes)
+        quantil.np = [1 + (total - 1) * d for d in quantil.dn]
+        return quantil
+
+    def adicionar(self, x):
+        if self.q is None:
+            self.iniciais.append(x)
+            if len(self.iniciais) == 5:
+                self.q = sorted(self.iniciais)
+                self.n = [1, 2, 3, 4, 5]
+                self.np = [1 + 4 * d for d in self.dn]
+                self.iniciais = []
+            return
+
+        q, n = self.q, self.n
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.np[i] += self.dn[i]
+
+        for i in range(1, 4):
+            d = self.np[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                candidato = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+                    (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if not q[i - 1] < candidato < q[i + 1]:
+                    candidato = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = candidato
+                n[i] += d
+
+    def valor(self):
+        if self.q is not None:
+            return self.q[2]
+        if not self.iniciais:
+            return None
+        valores = sorted(self.iniciais)
+        posicao = self.p * (len(valores) - 1)
+        base = int(posicao)
+        if base + 1 >= len(valores):
+            return valores[base]
+        return valores[base] + (valores[base + 1] - valores[base]) * (posicao - base)
+
+    def para_json(self):
+        return json.dumps({'p': self.p, 'iniciais': self.iniciais, 'q': self.q, 'n': self.n, 'np': self.np})
+
+    @classmethod
+    def de_json(cls, dados):
+        dados = json.loads(dados) if dados else {}
+        quantil = cls(dados.get('p', QUANTIL_MEDIANA))
+        quantil.iniciais = dados.get('iniciais', [])
+        quantil.q = dados.get('q')
+        quantil.n = dados.get('n')
+        quantil.np = dados.get('np')
+        return quantil
+
+def estado_vazio(elevador_id, campo):
+    return {
+        'elevador_id': elevador_id, 'campo': campo, 'n': 0, 'media': 0.0, 'm2': 0.0,
+        'minimo': None, 'ts_minimo': None, 'maximo': None, 'ts_maximo': None,
+        'inicio': None, 'fim': None, 'quantil': QuantilP2()
+    }
+
+def _estado_da_linha(linha):
+    estado = dict(linha._mapping)
+    estado.pop('id', None)
+    estado['quantil'] = QuantilP2.de_json(estado['quantil'])
+    return estado
+
+def _linha_do_estado(estado):
+    linha = dict(estado)
+    linha['quantil'] = estado['quantil'].para_json()
+    return linha
+
+def _semear_campo(conexao, elevador_id, campo, tabela_leituras):
+    estado = estado_vazio(elevador_id, campo)
+    filtro = f"FROM {tabela_leituras} WHERE elevador_id = :e AND {campo} IS NOT NULL"
+    n, media, media_quadrados, minimo, maximo, inicio, fim = conexao.execute(text(
+        f"SELECT COUNT({campo}), AVG({campo}), AVG({campo} * {campo}), MIN({campo}), MAX({campo}), MIN(ts), MAX(ts) {filtro}"
+    ), {'e': elevador_id}).one()
+    if not n:
+        return estado
+
+    def ts_do_valor(valor):
+        return conexao.execute(text(f"SELECT ts {filtro} AND {campo} = :v ORDER BY ts LIMIT 1"),
+                               {'e': elevador_id, 'v': valor}).scalar()
+
+    def valor_na_posicao(posicao):
+        return conexao.execute(text(f"SELECT {campo} {filtro} ORDER BY {campo} LIMIT 1 OFFSET :k"),
+                               {'e': elevador_id, 'k': posicao - 1}).scalar()
+
+    estado.update(
+        n=n, media=media, m2=max(0.0, n * (media_quadrados - media * media)),
+        minimo=minimo, ts_minimo=ts_do_valor(minimo), maximo=maximo, ts_maximo=ts_do_valor(maximo),
+        inicio=_como_datetime(inicio), fim=_como_datetime(fim)
+    )
+    estado['ts_minimo'] = _como_datetime(estado['ts_minimo'])
+    estado['ts_maximo'] = _como_datetime(estado['ts_maximo'])
+
+    if n < 5:
+        for valor in conexao.execute(text(f"SELECT {campo} {filtro}"), {'e': elevador_id}).scalars():
+            estado['quantil'].adicionar(valor)
+    else:
+        posicoes = [1 + round((n - 1) * d) for d in QuantilP2().dn]
+        alturas = [valor_na_posicao(p) for p in posicoes]
+        estado['quantil'] = QuantilP2.de_marcadores(alturas, posicoes, n)
+    return estado
+
+def _como_datetime(valor):
+    if valor is None or not isinstance(valor, str):
+        return valor
+    return datetime.fromisoformat(valor)
+
+def carregar(conexao, elevador_ids):
+    estados = {}
+    if not elevador_ids:
+        return estados
+    for linha in conexao.execute(select(tabela).where(tabela.c.elevador_id.in_(list(elevador_ids)))):
+        estado = _estado_da_linha(linha)
+        estados[(estado['elevador_id'], estado['campo'])] = estado
+    return estados
+
+def semear(conexao, elevador_id):
+    tabela_leituras = particoes.tabela_historico(conexao)
+    comando = sqlite_insert(tabela).on_conflict_do_nothing(index_elements=['elevador_id', 'campo'])
+    for campo in CAMPOS_ESTATISTICA:
+        estado = _semear_campo(conexao, elevador_id, campo, tabela_leituras)
+        conexao.execute(comando, [_linha_do_estado(estado)])
+    return carregar(conexao, [elevador_id])
+
+def obter(conexao, elevador_id):
+    estados = carregar(conexao, [elevador_id])
+    if not estados:
+        estados = semear(conexao, elevador_id)
+    return [estados[(elevador_id, campo)] for campo in CAMPOS_ESTATISTICA if (elevador_id, campo) in estados]
+
+def _mesclar(estado, pontos):
+    valores = [v for _, v in pontos]
+    n_lote = len(valores)
+    media_lote = sum(valores) / n_lote
+    m2_lote = sum((v - media_lote) ** 2 for v in valores)
+
+    n_total = estado['n'] + n_lote
+    delta = media_lote - estado['media']
+    estado['media'] += delta * n_lote / n_total
+    estado['m2'] += m2_lote + delta * delta * estado['n'] * n_lote / n_total
+    estado['n'] = n_total
+
+    for ts, valor in pontos:
+        if estado['minimo'] is None or valor < estado['minimo']:
+            estado['minimo'], estado['ts_minimo'] = valor, ts
+        if estado['maximo'] is None or valor > estado['maximo']:
+            estado['maximo'], estado['ts_maximo'] = valor, ts
+        estado['quantil'].adicionar(valor)
+
+    tss = [ts for ts, _ in pontos]
+    estado['inicio'] = min(tss + ([estado['inicio']] if estado['inicio'] else []))
+    estado['fim'] = max(tss + ([estado['fim']] if estado['fim'] else []))
+
+def _travar_escrita(conexao):
+    if not conexao.connection.driver_connection.in_transaction:
+        conexao.exec_driver_sql("BEGIN IMMEDIATE")
+
+def atualizar(conexao, linhas):
+    pontos = {}
+    for linha in linhas:
+        for campo in CAMPOS_ESTATISTICA:
+            valor = linha.get(campo)
+            if valor is None or isinstance(valor, bool):
+                continue
+            try:
+                valor = float(valor)
+            except (TypeError, ValueError):
+                continue
+            if math.isfinite(valor):
+                pontos.setdefault((linha['elevador_id'], campo), []).append((linha['ts'], valor))
+
+    _travar_escrita(conexao)
+    elevador_ids = {linha['elevador_id'] for linha in linhas}
+    estados = carregar(conexao, elevador_ids)
+    for elevador_id in elevador_ids - {e for e, _ in estados}:
+        estados.update(semear(conexao, elevador_id))
+
+    for chave, pontos_campo in pontos.items():
+        estado = estados[chave]
+        _mesclar(estado, pontos_campo)
+        linha = _linha_do_estado(estado)
+        conexao.execute(update(tabela)
+                        .where(tabela.c.elevador_id == chave[0], tabela.c.campo == chave[1])
+                        .values(**{k: v for k, v in linha.items() if k not in ('elevador_id', 'campo')}))
+
+def desvio_padrao(estado):
+    if estado['n'] < 2:
+        return 0.0
+    return math.sqrt(estado['m2'] / (estado['n'] - 1))
@@ -1,50 +1,167 @@
-import pandas as pd
-from sqlalchemy import create_engine
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy import create_engine, text, bindparam
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from datetime import datetime, timedelta
+from models import AnaliseDiaria, CheckpointJob
+import particoes
+import modelos_anomalia
 
-DB_URI = 'sqlite:///./dashboard/ascensus.db'
-engine = create_engine(DB_URI)
+basedir = os.path.abspath(os.path.dirname(__file__))
+DB_URI = 'sqlite:///' + os.environ.get('ASCENSUS_DB', os.path.join(basedir, 'ascensus.db'))
+_engines = {}
 
-def rodar_job_agregacao_diaria():
+NOME_JOB = 'agregacao_diaria'
+TAMANHO_CHUNK = 50000
+ELEVADORES_POR_SHARD = 50
+LIMIAR_CORRENTE_ALTA = 10
+
+SOMAS = {'temp_c': 'temp', 'vib_s1_ms2': 'vib', 'ia': 'corrente', 'tensao': 'tensao'}
+MAXIMOS = {'temp_c': 'temp_max', 'vib_s1_ms2': 'vib_max', 'ia': 'corrente_max'}
+
+def get_engine(db_uri=DB_URI):
+    chave = str(db_uri)
+    if chave not in _engines:
+        _engines[chave] = create_engine(db_uri)
+    return _engines[chave]
+
+def _agregar_chunk(chunk):
+    import pandas as pd
+    chunk['corrente_alta'] = chunk['ia'] > LIMIAR_CORRENTE_ALTA
+    grupos = chunk.groupby('elevador_id')
+    parcial = pd.DataFrame({'leituras_totais': grupos.size(), 'picos_corrente_alta': grupos['corrente_alta'].sum()})
+    for coluna, prefixo in SOMAS.items():
+        parcial[f'{prefixo}_soma'] = grupos[coluna].sum()
+        parcial[f'{prefixo}_n'] = grupos[coluna].count()
+    for coluna, nome in MAXIMOS.items():
+        parcial[nome] = grupos[coluna].max()
+    return parcial
+
+def agregar_shard(db_uri, elevador_ids, inicio, fim, tamanho_chunk=TAMANHO_CHUNK):
+    import pandas as pd
+    engine_shard = create_engine(db_uri)
+    parciais = []
+    try:
+        with engine_shard.connect() as conexao:
+            query = text(f"""
+                SELECT elevador_id, ia, temp_c, vib_s1_ms2, tensao
+                FROM {particoes.tabela_historico(conexao)}
+                WHERE elevador_id IN :ids AND ts >= :inicio AND ts < :fim
+            """).bindparams(bindparam('ids', expanding=True))
+            params = {'ids': list(elevador_ids), 'inicio': str(inicio), 'fim': str(fim)}
+            for chunk in pd.read_sql_query(query, conexao, params=params, chunksize=tamanho_chunk):
+                parciais.append(_agregar_chunk(chunk))
+    finally:
+        engine_shard.dispose()
+
+    if not parciais:
+        return []
+
+    total = pd.concat(parciais).groupby(level=0)
+    somas = total.sum()
+    maximos = total[list(MAXIMOS.values())].max()
+
+    df_agregado = pd.DataFrame(index=somas.index)
+    for prefixo in SOMAS.values():
+        df_agregado[f'{prefixo}_media'] = somas[f'{prefixo}_soma'] / somas[f'{prefixo}_n'].where(somas[f'{prefixo}_n'] > 0)
+    df_agregado[list(MAXIMOS.values())] = maximos
+    df_agregado['picos_corrente_alta'] = somas['picos_corrente_alta'].astype(int)
+    df_agregado['leituras_totais'] = somas['leituras_totais'].astype(int)
+    df_agregado = df_agregado.astype(object).where(df_agregado.notna(), None)
+    df_agregado.index.name = 'elevador_id'
+    return df_agregado.reset_index().to_dict('records')
+
+def _shards(elevador_ids, tamanho):
+    return [elevador_ids[i:i + tamanho] for i in range(0, len(elevador_ids), tamanho)]
+
+def gravar_analises(conexao, dia, linhas):
+    if not linhas:
+        return
+    tabela = AnaliseDiaria.__table__
+    comando = sqlite_insert(tabela)
+    colunas = [c for c in linhas[0] if c != 'elevador_id']
+    comando = comando.on_conflict_do_update(
+        index_elements=['elevador_id', 'data_referencia'],
+        set_={c: comando.excluded[c] for c in colunas})
+    conexao.execute(comando, [dict(linha, data_referencia=dia) for linha in linhas])
+
+def agregar_dia(dia, workers=None, db_uri=DB_URI):
+    engine = get_engine(db_uri)
+    fim = dia + timedelta(days=1)
+    with engine.connect() as conexao:
+        elevador_ids = conexao.execute(text(
+            f"SELECT DISTINCT elevador_id FROM {particoes.tabela_historico(conexao)} WHERE ts >= :inicio AND ts < :fim"
+        ), {'inicio': str(dia), 'fim': str(fim)}).scalars().all()
+    if not elevador_ids:
+        return 0
+
+    shards = _shards(sorted(elevador_ids), ELEVADORES_POR_SHARD)
+    workers = min(workers or os.cpu_count() or 1, len(shards))
+    if workers <= 1:
+        resultados = [agregar_shard(db_uri, shard, dia, fim) for shard in shards]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            resultados = list(pool.map(agregar_shard, [db_uri] * len(shards), shards, [dia] * len(shards), [fim] * len(shards)))
+
+    linhas = [linha for resultado in resultados for linha in resultado]
+    with engine.begin() as conexao:
+        gravar_analises(conexao, dia, linhas)
+    return len(linhas)
+
+def ler_checkpoint(db_uri=DB_URI):
+    with get_engine(db_uri).connect() as conexao:
+        valor = conexao.execute(text("SELECT ultima_data FROM checkpoint_job WHERE nome = :nome"), {'nome': NOME_JOB}).scalar()
+    return datetime.fromisoformat(str(valor)) if valor else None
+
+def salvar_checkpoint(dia, db_uri=DB_URI):
+    tabela = CheckpointJob.__table__
+    comando = sqlite_insert(tabela).values(nome=NOME_JOB, ultima_data=dia, atualizado_em=datetime.utcnow())
+    comando = comando.on_conflict_do_update(
+        index_elements=['nome'],
+        set_={'ultima_data': text("max(ultima_data, excluded.ultima_data)"), 'atualizado_em': comando.excluded.atualizado_em})
+    with get_engine(db_uri).begin() as conexao:
+        conexao.execute(comando)
+
+def rodar_job_agregacao_diaria(desde=None, ate=None, workers=None, db_uri=DB_URI):
     print(f"Iniciando job de agregação diária - {datetime.now()}")
     
-    ontem = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
-    
-    query = f"""
-        SELECT elevador_id, ts, ia, temp_c, vib_s1_ms2, tensao 
-        FROM sensor_log 
-        WHERE date(ts) = '{ontem}'
-    """
+    hoje = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    ontem = hoje - timedelta(days=1)
     
     try:
-        df_bruto = pd.read_sql_query(query, engine, parse_dates=['ts'])
-        
-        if df_bruto.empty:
-            print("Job de agregação: Sem dados de ontem para processar.")
-            return
-
-        df_agregado = df_bruto.groupby('elevador_id').agg(
-            temp_media=('temp_c', 'mean'),
-            temp_max=('temp_c', 'max'),
-            vib_media=('vib_s1_ms2', 'mean'),
-            vib_max=('vib_s1_ms2', 'max'),
-            corrente_media=('ia', 'mean'),
-            corrente_max=('ia', 'max'),
-            tensao_media=('tensao', 'mean'),
-            picos_corrente_alta=('ia', lambda x: (x > 10).sum()),
-            leituras_totais=('ts', 'count')
-        )
-        
-        df_agregado['data_referencia'] = pd.to_datetime(ontem)
-        
-        df_agregado.reset_index(inplace=True)
-        
-        df_agregado.to_sql('analise_diaria', engine, if_exists='append', index=False)
-        
-        print(f"Job de agregação concluído. {len(df_agregado)} linhas processadas.")
+        if desde is None:
+            checkpoint = ler_checkpoint(db_uri)
+            desde = checkpoint + timedelta(days=1) if checkpoint else ontem
+        ate = min(ate or ontem, ontem)
+
+        dias_processados = []
+        dia = desde
+        while dia <= ate:
+            linhas = agregar_dia(dia, workers, db_uri)
+            salvar_checkpoint(dia, db_uri)
+            dias_processados.append(dia)
+            print(f"Job de agregação: {dia:%Y-%m-%d} concluído. {linhas} linhas processadas.")
+            dia += timedelta(days=1)
+
+        if not dias_processados:
+            print("Job de agregação: Nenhum dia pendente para processar.")
+        else:
+            modelos_anomalia.treinar_apos_etl(get_engine(db_uri), dias_processados[0])
+            modelos_anomalia.rodar_pontuacao_frota(get_engine(db_uri), workers)
+        return dias_processados
 
     except Exception as e:
         print(f"Erro no job de agregação: {e}")
+        return []
+
+def _data(valor):
+    return datetime.strptime(valor, '%Y-%m-%d')
 
 if __name__ == '__main__':
-    rodar_job_agregacao_diaria()
+    parser = argparse.ArgumentParser(description="Agregação diária do sensor_log em analise_diaria.")
+    parser.add_argument('--desde', type=_data, help="primeiro dia a (re)processar, AAAA-MM-DD (padrão: dia seguinte ao checkpoint)")
+    parser.add_argument('--ate', type=_data, help="último dia a processar, AAAA-MM-DD (padrão: ontem)")
+    parser.add_argument('--workers', type=int, help="processos paralelos (padrão: número de CPUs)")
+    args = parser.parse_args()
+    rodar_job_agregacao_diaria(args.desde, args.ate, args.workers)
@@ -0,0 +1,84 @@
+import math
+import struct
+
+MAGICO = b'AB'
+CABECALHO = struct.Struct('<2sBBHB')
+VERSAO_ATUAL = 1
+
+ESQUEMAS = {
+    1: (struct.Struct('<Iffffff4HB3x'), ('atraso_ms', 'ia', 'temp_c', 'vib_s1_ms2', 'velocidade', 'tensao', 'altura',
+                                         'dist_l1', 'dist_l2', 'dist_o1', 'dist_o2', 'estado')),
+}
+MAX_REGISTROS = 65535
+INTEIROS = {'atraso_ms', 'dist_l1', 'dist_l2', 'dist_o1', 'dist_o2', 'estado'}
+PADROES = {'atraso_ms': 0, 'tensao': math.nan, 'altura': math.nan, 'estado': 0,
+           'dist_l1': 200, 'dist_l2': 200, 'dist_o1': 200, 'dist_o2': 200}
+
+def _opcional(valor):
+    return valor if math.isfinite(valor) else None
+
+def descrever():
+    return {
+        'magico': MAGICO.decode('ascii'), 'versao_atual': VERSAO_ATUAL, 'cabecalho': CABECALHO.format,
+        'versoes': {v: {'formato': r.format, 'tamanho': r.size, 'campos': list(c)} for v, (r, c) in ESQUEMAS.items()}
+    }
+
+def decodificar(corpo):
+    visao = memoryview(corpo)
+    if len(visao) < CABECALHO.size:
+        raise ValueError("Pacote menor que o cabeçalho.")
+    magico, versao, _, quantidade, tamanho_id = CABECALHO.unpack_from(visao)
+    if magico != MAGICO:
+        raise ValueError("Pacote binário com assinatura inválida.")
+    if versao not in ESQUEMAS:
+        raise ValueError(f"Versão {versao} do formato binário não suportada.")
+
+    registro, campos = ESQUEMAS[versao]
+    inicio = CABECALHO.size + tamanho_id
+    fim = inicio + quantidade * registro.size
+    if len(visao) != fim:
+        raise ValueError(f"Tamanho do pacote ({len(visao)} bytes) não confere com {quantidade} registros da versão {versao}.")
+
+    elevador_id = bytes(visao[CABECALHO.size:inicio]).decode('utf-8') or None
+    return elevador_id, [dict(zip(campos, valores)) for valores in registro.iter_unpack(visao[inicio:fim])]
+
+def leitura_limpa(registro, agora_ms, elevador_id):
+    dados_limpos = {
+        't': agora_ms - registro['atraso_ms'],
+        'ia': registro['ia'],
+        'temp_c': registro['temp_c'],
+        'vib_s1_ms2': registro['vib_s1_ms2'],
+        'velocidade': registro['velocidade'],
+        'estado': registro['estado'],
+        'dist_l1': float(registro['dist_l1']),
+        'dist_l2': float(registro['dist_l2']),
+        'dist_o1': float(registro['dist_o1']),
+        'dist_o2': float(registro['dist_o2']),
+        'altura': _opcional(registro['altura']),
+        'id_elevador': elevador_id
+    }
+    for campo in ('ia', 'temp_c', 'vib_s1_ms2', 'velocidade'):
+        if not math.isfinite(dados_limpos[campo]):
+            dados_limpos[campo] = 0.0
+
+    tensao = _opcional(registro['tensao'])
+    if tensao is None:
+        tensao = max(0.0, min(20.0, dados_limpos['ia'] * 2.0))
+    dados_limpos['tensao'] = tensao
+    return dados_limpos
+
+def codificar(elevador_id, registros, versao=VERSAO_ATUAL):
+    registro, campos = ESQUEMAS[versao]
+    if len(registros) > MAX_REGISTROS:
+        raise ValueError(f"No máximo {MAX_REGISTROS} registros por pacote.")
+    id_bytes = (elevador_id or '').encode('utf-8')
+    partes = [CABECALHO.pack(MAGICO, versao, 0, len(registros), len(id_bytes)), id_bytes]
+    for r in registros:
+        valores = []
+        for campo in campos:
+            valor = r.get(campo)
+            if valor is None:
+                valor = PADROES.get(campo, 0.0)
+            valores.append(int(valor) if campo in INTEIROS else float(valor))
+        partes.append(registro.pack(*valores))
+    return b''.join(partes)
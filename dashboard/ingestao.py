@@ -0,0 +1,296 @@
+import atexit
+import math
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import insert, select
+from extensions import db
+from models import Elevador, SensorLog
+import estatisticas
+import rollups
+from instrumentacao import telemetria
+
+CAMPOS_SENSOR = ['ia', 'temp_c', 'vib_s1_ms2', 'tensao', 'velocidade']
+MAX_LEITURAS_LOTE = 10000
+TTL_ELEVADORES_S = 30.0
+
+def linha_sensor(elevador_id, data):
+    if not isinstance(data, dict):
+        raise ValueError("Leitura deve ser um objeto JSON.")
+    try:
+        linha = {
+            'ts': datetime.fromtimestamp(_numero(data.get('t', 0)) / 1000.0),
+            'elevador_id': elevador_id
+        }
+    except (ValueError, OverflowError, OSError):
+        raise ValueError("Campo 't' ausente ou inválido.")
+    invalidos = []
+    for campo in CAMPOS_SENSOR:
+        valor = data.get(campo)
+        try:
+            linha[campo] = None if valor is None else _numero(valor)
+        except ValueError:
+            invalidos.append(campo)
+    if invalidos:
+        raise ValueError(f"Campos inválidos: {', '.join(invalidos)}")
+    return linha
+
+def gravar_leituras(linhas):
+    if not linhas:
+        return []
+    conexao = db.session.connection()
+    ids = {linha['elevador_id'] for linha in linhas}
+    existentes = set(conexao.execute(select(Elevador.id).where(Elevador.id.in_(ids))).scalars())
+    if len(existentes) < len(ids):
+        linhas = [linha for linha in linhas if linha['elevador_id'] in existentes]
+    if linhas:
+        estatisticas.atualizar(conexao, linhas)
+        rollups.atualizar(conexao, linhas)
+        db.session.execute(insert(SensorLog), linhas)
+    return linhas
+
+def _numero(valor):
+    if isinstance(valor, bool) or not isinstance(valor, (int, float)) or not math.isfinite(valor):
+        raise ValueError
+    return float(valor)
+
+def expandir_lote(payload):
+    if isinstance(payload, list):
+        return payload
+    if not isinstance(payload, dict):
+        raise ValueError("O lote deve ser uma lista de leituras ou um objeto com 'leituras' ou 'series'.")
+    if 'leituras' in payload:
+        if not isinstance(payload['leituras'], list):
+            raise ValueError("'leituras' deve ser uma lista.")
+        return payload['leituras']
+
+    series = payload.get('series', [payload] if 't' in payload else None)
+    if not isinstance(series, list):
+        raise ValueError("O lote deve ser uma lista de leituras ou um objeto com 'leituras' ou 'series'.")
+
+    itens = []
+    for serie in series:
+        if not isinstance(serie, dict) or not isinstance(serie.get('t'), list):
+            itens.append(serie)
+            continue
+        colunas = {campo: serie.get(campo) for campo in CAMPOS_SENSOR if isinstance(serie.get(campo), list)}
+        for i, t in enumerate(serie['t']):
+            item = {'elevador_id': serie.get('elevador_id'), 't': t}
+            for campo, valores in colunas.items():
+                item[campo] = valores[i] if i < len(valores) else None
+            itens.append(item)
+    return itens
+
+def validar_lote(itens, elevadores_existentes):
+    linhas = []
+    resultados = []
+    for indice, item in enumerate(itens):
+        resultado = {"indice": indice}
+        resultados.append(resultado)
+
+        if not isinstance(item, dict):
+            resultado.update(status="erro", mensagem="Leitura deve ser um objeto JSON.")
+            continue
+
+        elevador_id = item.get('elevador_id')
+        resultado['elevador_id'] = elevador_id
+        if not isinstance(elevador_id, str):
+            resultado.update(status="erro", mensagem="Campo 'elevador_id' ausente ou inválido.")
+            continue
+        if elevador_id not in elevadores_existentes:
+            resultado.update(status="erro", mensagem="ID do elevador não encontrado")
+            continue
+
+        try:
+            t = _numero(item.get('t'))
+            linha = {'ts': datetime.fromtimestamp(t / 1000.0), 'elevador_id': elevador_id}
+        except (ValueError, OverflowError, OSError):
+            resultado.update(status="erro", mensagem="Campo 't' ausente ou inválido.")
+            continue
+
+        invalidos = []
+        for campo in CAMPOS_SENSOR:
+            valor = item.get(campo)
+            try:
+                linha[campo] = None if valor is None else _numero(valor)
+            except ValueError:
+                invalidos.append(campo)
+        if invalidos:
+            resultado.update(status="erro", mensagem=f"Campos inválidos: {', '.join(invalidos)}")
+            continue
+
+        resultado['status'] = "sucesso"
+        linhas.append(linha)
+    return linhas, resultados
+
+def validar_eventos(itens, elevadores_existentes):
+    linhas = []
+    for item in itens:
+        if not isinstance(item, dict) or not isinstance(item.get('elevador_id'), str) or item['elevador_id'] not in elevadores_existentes:
+            continue
+        try:
+            linha = {
+                'elevador_id': item['elevador_id'],
+                'ts': datetime.fromtimestamp(_numero(item.get('t')) / 1000.0),
+                'campo': str(item['campo'])[:20],
+                'detector': str(item['detector'])[:20],
+                'valor': _numero(item.get('valor'))
+            }
+            for campo in ('referencia', 'limite', 'z'):
+                valor = item.get(campo)
+                linha[campo] = _numero(valor) if isinstance(valor, (int, float)) and math.isfinite(valor) else None
+        except (KeyError, ValueError, OverflowError, OSError):
+            continue
+        linhas.append(linha)
+    return linhas
+
+class BufferIngestao:
+    def __init__(self, max_linhas=500, intervalo_s=1.0, capacidade=50000, ttl_elevadores_s=TTL_ELEVADORES_S):
+        self.app = None
+        self.max_linhas = max_linhas
+        self.intervalo_s = intervalo_s
+        self.capacidade = capacidade
+        self.ttl_elevadores_s = ttl_elevadores_s
+        self._linhas = []
+        self._lock = threading.Lock()
+        self._lock_gravacao = threading.Lock()
+        self._evento = threading.Event()
+        self._parar = threading.Event()
+        self._thread = None
+        self._elevadores_conhecidos = {}
+        self.contadores = {
+            'linhas_recebidas': 0,
+            'linhas_gravadas': 0,
+            'linhas_descartadas': 0,
+            'lotes_gravados': 0,
+            'erros_gravacao': 0,
+            'ultima_latencia_ms': 0.0,
+            'max_latencia_ms': 0.0,
+            'soma_latencia_ms': 0.0
+        }
+
+    def init_app(self, app):
+        self.app = app
+        self.max_linhas = app.config.get('INGESTAO_MAX_LINHAS', self.max_linhas)
+        self.intervalo_s = app.config.get('INGESTAO_INTERVALO_S', self.intervalo_s)
+        self.capacidade = app.config.get('INGESTAO_CAPACIDADE', self.capacidade)
+        self.ttl_elevadores_s = app.config.get('INGESTAO_TTL_ELEVADORES_S', self.ttl_elevadores_s)
+        app.extensions['buffer_ingestao'] = self
+
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='buffer-ingestao', daemon=True)
+            self._thread.start()
+            atexit.register(self.encerrar)
+
+    def _conhecidos(self, ids):
+        agora = time.monotonic()
+        return {i for i in ids if self._elevadores_conhecidos.get(i, 0.0) > agora}
+
+    def _lembrar(self, ids):
+        validade = time.monotonic() + self.ttl_elevadores_s
+        for elevador_id in ids:
+            self._elevadores_conhecidos[elevador_id] = validade
+
+    def elevador_existe(self, elevador_id):
+        if self._conhecidos([elevador_id]):
+            return True
+        if not Elevador.query.get(elevador_id):
+            return False
+        self._lembrar([elevador_id])
+        return True
+
+    def filtrar_existentes(self, elevador_ids):
+        ids = {i for i in elevador_ids if isinstance(i, str)}
+        conhecidos = self._conhecidos(ids)
+        desconhecidos = ids - conhecidos
+        if desconhecidos:
+            encontrados = {e.id for e in db.session.query(Elevador.id).filter(Elevador.id.in_(desconhecidos)).all()}
+            self._lembrar(encontrados)
+            conhecidos |= encontrados
+        return conhecidos
+
+    def esquecer_elevador(self, elevador_id):
+        with self._lock:
+            self._elevadores_conhecidos.pop(elevador_id, None)
+            self._linhas = [l for l in self._linhas if l['elevador_id'] != elevador_id]
+
+    def adicionar(self, linha):
+        with self._lock:
+            self._linhas.append(linha)
+            self.contadores['linhas_recebidas'] += 1
+            excesso = len(self._linhas) - self.capacidade
+            if excesso > 0:
+                del self._linhas[:excesso]
+                self.contadores['linhas_descartadas'] += excesso
+            tamanho = len(self._linhas)
+
+        if tamanho >= self.max_linhas:
+            self._evento.set()
+
+    def _loop(self):
+        while not self._parar.is_set():
+            self._evento.wait(self.intervalo_s)
+            self._evento.clear()
+            self.descarregar()
+
+    def descarregar(self):
+        with self._lock_gravacao:
+            with self._lock:
+                linhas, self._linhas = self._linhas, []
+            if not linhas:
+                return 0
+
+            inicio = time.perf_counter()
+            try:
+                with self.app.app_context():
+                    gravadas = gravar_leituras(linhas)
+                    db.session.commit()
+            except Exception as e:
+                print(f"Erro ao gravar lote de {len(linhas)} leituras: {e}")
+                with self._lock:
+                    self.contadores['erros_gravacao'] += 1
+                return self._gravar_individualmente(linhas)
+
+            latencia_ms = (time.perf_counter() - inicio) * 1000.0
+            telemetria.histograma('ingestao_commit_lote').observar(latencia_ms)
+            with self._lock:
+                self.contadores['linhas_gravadas'] += len(gravadas)
+                self.contadores['linhas_descartadas'] += len(linhas) - len(gravadas)
+                self.contadores['lotes_gravados'] += 1
+                self.contadores['ultima_latencia_ms'] = latencia_ms
+                self.contadores['soma_latencia_ms'] += latencia_ms
+                self.contadores['max_latencia_ms'] = max(self.contadores['max_latencia_ms'], latencia_ms)
+            return len(gravadas)
+
+    def _gravar_individualmente(self, linhas):
+        gravadas = 0
+        with self.app.app_context():
+            for linha in linhas:
+                try:
+                    gravadas += len(gravar_leituras([linha]))
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Leitura descartada de {linha.get('elevador_id')} em {linha.get('ts')}: {e}")
+        with self._lock:
+            self.contadores['linhas_gravadas'] += gravadas
+            self.contadores['linhas_descartadas'] += len(linhas) - gravadas
+        return gravadas
+
+    def encerrar(self):
+        self._parar.set()
+        self._evento.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.descarregar()
+
+    def metricas(self):
+        with self._lock:
+            metricas = dict(self.contadores)
+            metricas['profundidade_fila'] = len(self._linhas)
+            metricas['elevadores_em_cache'] = len(self._elevadores_conhecidos)
+        lotes = metricas['lotes_gravados']
+        metricas['media_latencia_ms'] = metricas['soma_latencia_ms'] / lotes if lotes else 0.0
+        return metricas
+
+buffer_sensores = BufferIngestao()
@@ -0,0 +1,228 @@
+import os
+import sys
+import bisect
+import collections
+import contextlib
+import functools
+import threading
+import time
+from flask import Blueprint, Response, jsonify, request
+
+LIMITES_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+PREFIXO = 'ascensus'
+INTERVALO_MIN_MS = 5.0
+DURACAO_MAX_S = 300.0
+ENDERECOS_LOCAIS = {'127.0.0.1', '::1'}
+
+class Histograma:
+    __slots__ = ('baldes', 'total', 'soma_ms', 'max_ms', '_lock')
+
+    def __init__(self):
+        self.baldes = [0] * (len(LIMITES_MS) + 1)
+        self.total = 0
+        self.soma_ms = 0.0
+        self.max_ms = 0.0
+        self._lock = threading.Lock()
+
+    def observar(self, ms):
+        indice = bisect.bisect_left(LIMITES_MS, ms)
+        with self._lock:
+            self.baldes[indice] += 1
+            self.total += 1
+            self.soma_ms += ms
+            if ms > self.max_ms:
+                self.max_ms = ms
+
+    def quantil(self, q):
+        with self._lock:
+            baldes, total, maximo = list(self.baldes), self.total, self.max_ms
+        acumulado = 0
+        for indice, quantidade in enumerate(baldes):
+            acumulado += quantidade
+            if quantidade and acumulado >= q * total:
+                return min(LIMITES_MS[indice], maximo) if indice < len(LIMITES_MS) else maximo
+        return None
+
+    def resumo(self):
+        return {
+            'n': self.total,
+            'media_ms': self.soma_ms / self.total if self.total else 0.0,
+            'p50_ms': self.quantil(0.50),
+            'p99_ms': self.quantil(0.99),
+            'max_ms': self.max_ms
+        }
+
+class PerfiladorAmostral:
+    def __init__(self, max_pilhas=5000, profundidade=40):
+        self.max_pilhas = max_pilhas
+        self.profundidade = profundidade
+        self._amostras = collections.Counter()
+        self._lock = threading.Lock()
+        self._ativo = threading.Event()
+        self._thread = None
+        self.intervalo_ms = 10.0
+        self.total = 0
+        self.iniciado_em = None
+
+    def iniciar(self, intervalo_ms=10.0, duracao_s=60.0):
+        intervalo_ms = max(INTERVALO_MIN_MS, float(intervalo_ms))
+        duracao_s = min(DURACAO_MAX_S, float(duracao_s or DURACAO_MAX_S))
+        if duracao_s <= 0:
+            raise ValueError(duracao_s)
+        if self._ativo.is_set():
+            return False
+        self.intervalo_ms = intervalo_ms
+        with self._lock:
+            self._amostras.clear()
+            self.total = 0
+        self.iniciado_em = time.time()
+        self._ativo.set()
+        self._thread = threading.Thread(target=self._loop, args=(duracao_s,), name='perfilador-amostral', daemon=True)
+        self._thread.start()
+        return True
+
+    @property
+    def ativo(self):
+        return self._ativo.is_set()
+
+    def parar(self):
+        self._ativo.clear()
+
+    def _pilha(self, frame):
+        partes = []
+        while frame is not None and len(partes) < self.profundidade:
+            codigo = frame.f_code
+            partes.append(f"{os.path.basename(codigo.co_filename)}:{codigo.co_name}:{frame.f_lineno}")
+            frame = frame.f_back
+        return ';'.join(reversed(partes))
+
+    def _loop(self, duracao_s):
+        proprio = threading.get_ident()
+        fim = time.monotonic() + duracao_s
+        while self._ativo.is_set() and time.monotonic() < fim:
+            pilhas = [self._pilha(frame) for ident, frame in sys._current_frames().items() if ident != proprio]
+            with self._lock:
+                for pilha in pilhas:
+                    if pilha in self._amostras or len(self._amostras) < self.max_pilhas:
+                        self._amostras[pilha] += 1
+                self.total += len(pilhas)
+            time.sleep(self.intervalo_ms / 1000.0)
+        self._ativo.clear()
+
+    def relatorio(self, limite=50):
+        with self._lock:
+            pilhas = self._amostras.most_common(limite)
+        return {
+            'ativo': self.ativo,
+            'iniciado_em': self.iniciado_em,
+            'intervalo_ms': self.intervalo_ms,
+            'amostras': self.total,
+            'pilhas': [{'pilha': p, 'amostras': n} for p, n in pilhas]
+        }
+
+    def colapsado(self):
+        with self._lock:
+            pilhas = self._amostras.most_common()
+        return ''.join(f"{pilha} {n}\n" for pilha, n in pilhas)
+
+class Telemetria:
+    def __init__(self):
+        self._histogramas = {}
+        self._contadores = collections.Counter()
+        self._lock = threading.Lock()
+        self.perfilador = PerfiladorAmostral()
+
+    def histograma(self, nome):
+        histograma = self._histogramas.get(nome)
+        if histograma is None:
+            with self._lock:
+                histograma = self._histogramas.setdefault(nome, Histograma())
+        return histograma
+
+    def observar(self, nome, inicio):
+        self.histograma(nome).observar((time.perf_counter() - inicio) * 1000.0)
+
+    @contextlib.contextmanager
+    def medir(self, nome):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(nome, inicio)
+
+    def contar(self, nome, quantidade=1):
+        with self._lock:
+            self._contadores[nome] += quantidade
+
+    def metricas(self):
+        with self._lock:
+            histogramas = dict(self._histogramas)
+            contadores = dict(self._contadores)
+        return {
+            'pid': os.getpid(),
+            'histogramas': {nome: h.resumo() for nome, h in sorted(histogramas.items())},
+            'contadores': contadores,
+            'perfilador_ativo': self.perfilador.ativo
+        }
+
+    def prometheus(self):
+        with self._lock:
+            histogramas = dict(self._histogramas)
+            contadores = dict(self._contadores)
+        linhas = []
+        for nome, histograma in sorted(histogramas.items()):
+            metrica = f"{PREFIXO}_{nome}_segundos"
+            with histograma._lock:
+                baldes, total, soma_ms = list(histograma.baldes), histograma.total, histograma.soma_ms
+            linhas.append(f"# TYPE {metrica} histogram")
+            acumulado = 0
+            for limite, quantidade in zip(LIMITES_MS, baldes):
+                acumulado += quantidade
+                linhas.append(f'{metrica}_bucket{{le="{limite / 1000.0:g}"}} {acumulado}')
+            linhas.append(f'{metrica}_bucket{{le="+Inf"}} {total}')
+            linhas.append(f"{metrica}_sum {soma_ms / 1000.0:.6f}")
+            linhas.append(f"{metrica}_count {total}")
+        for nome, valor in sorted(contadores.items()):
+            linhas.append(f"# TYPE {PREFIXO}_{nome}_total counter")
+            linhas.append(f"{PREFIXO}_{nome}_total {valor}")
+        return '\n'.join(linhas) + '\n'
+
+telemetria = Telemetria()
+
+metricas_bp = Blueprint('metricas', __name__)
+
+def _somente_local(rota):
+    @functools.wraps(rota)
+    def envoltorio(*args, **kwargs):
+        if request.remote_addr not in ENDERECOS_LOCAIS:
+            return jsonify({"status": "erro", "mensagem": "O perfilador só pode ser usado a partir do próprio servidor."}), 403
+        return rota(*args, **kwargs)
+    return envoltorio
+
+@metricas_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    if request.args.get('formato') == 'json':
+        return jsonify(telemetria.metricas())
+    return Response(telemetria.prometheus(), mimetype='text/plain; version=0.0.4')
+
+@metricas_bp.route('/metrics/perfilador', methods=['GET'])
+@_somente_local
+def get_perfilador():
+    if request.args.get('formato') == 'colapsado':
+        return Response(telemetria.perfilador.colapsado(), mimetype='text/plain')
+    return jsonify(telemetria.perfilador.relatorio(request.args.get('limite', 50, type=int)))
+
+@metricas_bp.route('/metrics/perfilador', methods=['POST'])
+@_somente_local
+def alternar_perfilador():
+    data = request.get_json(silent=True) or {}
+    if data.get('ativo', True):
+        try:
+            iniciado = telemetria.perfilador.iniciar(data.get('intervalo_ms', 10.0), data.get('duracao_s', 60.0))
+        except (TypeError, ValueError):
+            return jsonify({"status": "erro", "mensagem": "'intervalo_ms' e 'duracao_s' devem ser números positivos"}), 400
+        mensagem = "Perfilador iniciado." if iniciado else "Perfilador já estava ativo."
+    else:
+        telemetria.perfilador.parar()
+        mensagem = "Perfilador parado."
+    return jsonify({"status": "sucesso", "mensagem": mensagem, "ativo": telemetria.perfilador.ativo})
@@ -0,0 +1,31 @@
+from sqlalchemy import text
+from api_server import app
+from extensions import db
+import particoes
+
+MIGRACOES = [
+    "CREATE INDEX IF NOT EXISTS ix_sensor_log_elevador_ts ON sensor_log (elevador_id, ts)",
+    "CREATE INDEX IF NOT EXISTS ix_sensor_log_ts ON sensor_log (ts)",
+    "CREATE INDEX IF NOT EXISTS ix_historico_elevador_ts ON historico (elevador_id, ts, id)",
+    "UPDATE analise_diaria SET data_referencia = strftime('%Y-%m-%d 00:00:00.000000', data_referencia)",
+    "DELETE FROM analise_diaria WHERE id NOT IN (SELECT MAX(id) FROM analise_diaria GROUP BY elevador_id, data_referencia)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_analise_diaria_elevador_data ON analise_diaria (elevador_id, data_referencia)",
+]
+
+def migrar():
+    with app.app_context():
+        db.create_all()
+        with db.engine.begin() as conexao:
+            modo = conexao.execute(text("PRAGMA journal_mode=WAL")).scalar()
+            for comando in MIGRACOES:
+                conexao.execute(text(comando))
+            particoes.recriar_visao(conexao)
+            conexao.execute(text("ANALYZE"))
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conexao:
+            if conexao.execute(text("PRAGMA auto_vacuum")).scalar() != 2:
+                conexao.execute(text("PRAGMA auto_vacuum=INCREMENTAL"))
+                conexao.execute(text("VACUUM"))
+    print(f"Banco migrado (journal_mode={modo}).")
+
+if __name__ == '__main__':
+    migrar()
@@ -0,0 +1,221 @@
+import os
+import collections
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from sqlalchemy import text, bindparam
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import PontuacaoFrota
+from instrumentacao import telemetria
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+DIRETORIO_MODELOS = os.path.join(basedir, 'modelos')
+FEATURES = ['temp_media', 'temp_max', 'vib_max', 'corrente_max', 'picos_corrente_alta']
+COLUNAS_RELATORIO = ['data', 'temp_media', 'temp_max', 'vib_max', 'corrente_max', 'picos_corrente_alta', 'leituras_totais']
+MIN_DIAS = 2
+CONTAMINACAO = 0.1
+LINHAS_POR_BLOCO = 20000
+LIMIAR_DESVIO = 6.0
+
+def ler_analises(conexao, elevador_ids):
+    import pandas as pd
+    consulta = text(f"""
+        SELECT elevador_id, strftime('%Y-%m-%d', data_referencia) AS data, {', '.join(COLUNAS_RELATORIO[1:])}
+        FROM analise_diaria
+        WHERE elevador_id IN :ids
+        ORDER BY elevador_id, data_referencia DESC
+    """).bindparams(bindparam('ids', expanding=True))
+    return pd.read_sql_query(consulta, conexao, params={'ids': list(elevador_ids)})
+
+def _matriz(df):
+    return df[FEATURES].fillna(0).to_numpy(dtype=float)
+
+def ajustar(df):
+    from sklearn.ensemble import IsolationForest
+    modelo = IsolationForest(contamination=CONTAMINACAO, random_state=42)
+    matriz = _matriz(df)
+    modelo.fit(matriz)
+    return {
+        'modelo': modelo,
+        'treinado_em': datetime.now().isoformat(),
+        'pontuacoes': dict(zip(df['data'], (modelo.predict(matriz) == -1).tolist()))
+    }
+
+class RegistroModelos:
+    def __init__(self, diretorio=DIRETORIO_MODELOS, capacidade=256):
+        self.diretorio = diretorio
+        self.capacidade = capacidade
+        self._cache = collections.OrderedDict()
+        self._respostas = {}
+        self._lock = threading.Lock()
+        self.contadores = {'acertos': 0, 'carregados': 0, 'treinados': 0, 'dias_pontuados': 0, 'respostas_em_cache': 0}
+
+    def caminho(self, elevador_id):
+        return os.path.join(self.diretorio, f"{elevador_id}.joblib")
+
+    def _guardar(self, elevador_id, versao, entrada):
+        with self._lock:
+            self._cache[elevador_id] = (versao, entrada)
+            self._cache.move_to_end(elevador_id)
+            while len(self._cache) > self.capacidade:
+                removido, _ = self._cache.popitem(last=False)
+                self._respostas.pop(removido, None)
+
+    def obter(self, elevador_id):
+        try:
+            versao = os.stat(self.caminho(elevador_id)).st_mtime_ns
+        except FileNotFoundError:
+            return None, None
+        with self._lock:
+            atual = self._cache.get(elevador_id)
+            if atual is not None and atual[0] == versao:
+                self._cache.move_to_end(elevador_id)
+                self.contadores['acertos'] += 1
+                return atual
+        import joblib
+        entrada = joblib.load(self.caminho(elevador_id))
+        self.contadores['carregados'] += 1
+        self._guardar(elevador_id, versao, entrada)
+        return versao, entrada
+
+    def salvar(self, elevador_id, entrada):
+        import joblib
+        os.makedirs(self.diretorio, exist_ok=True)
+        caminho = self.caminho(elevador_id)
+        temporario = f"{caminho}.{os.getpid()}.tmp"
+        joblib.dump(entrada, temporario)
+        os.replace(temporario, caminho)
+        self.contadores['treinados'] += 1
+        self._guardar(elevador_id, os.stat(caminho).st_mtime_ns, entrada)
+
+    def treinar(self, conexao, elevador_ids):
+        treinados = 0
+        df = ler_analises(conexao, elevador_ids)
+        for elevador_id, df_elevador in df.groupby('elevador_id'):
+            if len(df_elevador) >= MIN_DIAS:
+                self.salvar(elevador_id, ajustar(df_elevador))
+                treinados += 1
+        return treinados
+
+    def remover(self, elevador_id):
+        with self._lock:
+            self._cache.pop(elevador_id, None)
+            self._respostas.pop(elevador_id, None)
+        try:
+            os.remove(self.caminho(elevador_id))
+        except FileNotFoundError:
+            pass
+
+    def analise_diaria(self, conexao, elevador_id):
+        total, ultima = conexao.execute(text(
+            "SELECT COUNT(*), MAX(data_referencia) FROM analise_diaria WHERE elevador_id = :e"
+        ), {'e': elevador_id}).one()
+        if not total:
+            return None
+
+        versao, entrada = self.obter(elevador_id)
+        chave = (total, ultima, versao)
+        with self._lock:
+            resposta = self._respostas.get(elevador_id)
+        if resposta is not None and resposta[0] == chave:
+            self.contadores['respostas_em_cache'] += 1
+            return resposta[1]
+
+        inicio = time.perf_counter()
+        df = ler_analises(conexao, [elevador_id]).drop(columns='elevador_id')
+        telemetria.observar('analise_diaria_leitura', inicio)
+        if entrada is None and len(df) >= MIN_DIAS:
+            inicio = time.perf_counter()
+            entrada = ajustar(df)
+            telemetria.observar('analise_diaria_ajuste_modelo', inicio)
+            self.salvar(elevador_id, entrada)
+            versao, entrada = self.obter(elevador_id)
+            chave = (total, ultima, versao)
+
+        if entrada is None:
+            df['anomalia'] = False
+        else:
+            pontuacoes = entrada['pontuacoes']
+            novos = ~df['data'].isin(list(pontuacoes))
+            if novos.any():
+                previsoes = entrada['modelo'].predict(_matriz(df[novos])) == -1
+                pontuacoes.update(zip(df.loc[novos, 'data'], previsoes.tolist()))
+                self.contadores['dias_pontuados'] += int(novos.sum())
+            df['anomalia'] = df['data'].map(pontuacoes).astype(bool)
+
+        relatorio = df.astype(object).where(df.notna(), None).to_dict('records')
+        with self._lock:
+            self._respostas[elevador_id] = (chave, relatorio)
+        return relatorio
+
+    def metricas(self):
+        with self._lock:
+            metricas = dict(self.contadores)
+            metricas['modelos_em_memoria'] = len(self._cache)
+        return metricas
+
+registro_modelos = RegistroModelos()
+
+def treinar_apos_etl(engine, desde):
+    try:
+        with engine.connect() as conexao:
+            elevador_ids = conexao.execute(text(
+                "SELECT DISTINCT elevador_id FROM analise_diaria WHERE data_referencia >= :desde"
+            ), {'desde': str(desde)}).scalars().all()
+            treinados = registro_modelos.treinar(conexao, elevador_ids) if elevador_ids else 0
+        print(f"Modelos de anomalia treinados: {treinados}")
+    except Exception as e:
+        print(f"Erro ao treinar modelos de anomalia: {e}")
+
+def matriz_frota(df):
+    grupos = df.groupby('elevador_id')[FEATURES]
+    valores = df[FEATURES].astype(float)
+    medias = grupos.transform('mean')
+    desvios = grupos.transform('std').fillna(0).replace(0, 1)
+    return ((valores - medias) / desvios).fillna(0).to_numpy(dtype=float)
+
+def pontuar_frota(engine, workers=None):
+    import numpy as np
+    import pandas as pd
+    from sklearn.ensemble import IsolationForest
+    workers = workers or os.cpu_count() or 1
+    with engine.connect() as conexao:
+        df = pd.read_sql_query(text(f"""
+            SELECT elevador_id, data_referencia, {', '.join(FEATURES)}
+            FROM analise_diaria
+            ORDER BY elevador_id, data_referencia
+        """), conexao)
+    if df.empty:
+        return 0
+
+    matriz = matriz_frota(df)
+    modelo = IsolationForest(contamination=CONTAMINACAO, random_state=42, n_jobs=workers)
+    modelo.fit(matriz)
+
+    ultimos = df.drop_duplicates('elevador_id', keep='last').index.to_numpy()
+    blocos = np.array_split(matriz[ultimos], max(1, min(workers, -(-len(ultimos) // LINHAS_POR_BLOCO))))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        decisoes = np.concatenate(list(pool.map(modelo.decision_function, blocos)))
+    desvios = np.abs(matriz[ultimos]).max(axis=1)
+
+    agora = datetime.utcnow()
+    linhas = [
+        {'elevador_id': e, 'data_referencia': pd.Timestamp(d).to_pydatetime(), 'score': float(-decisao),
+         'desvio_max': float(desvio), 'anomalia': bool(decisao < 0 or desvio >= LIMIAR_DESVIO), 'calculado_em': agora}
+        for e, d, decisao, desvio in zip(df['elevador_id'].to_numpy()[ultimos], df['data_referencia'].to_numpy()[ultimos], decisoes, desvios)
+    ]
+    tabela = PontuacaoFrota.__table__
+    comando = sqlite_insert(tabela)
+    comando = comando.on_conflict_do_update(
+        index_elements=['elevador_id'],
+        set_={c: comando.excluded[c] for c in ('data_referencia', 'score', 'desvio_max', 'anomalia', 'calculado_em')})
+    with engine.begin() as conexao:
+        conexao.execute(comando, linhas)
+    return len(linhas)
+
+def rodar_pontuacao_frota(engine, workers=None):
+    try:
+        print(f"Pontuação de anomalias da frota concluída: {pontuar_frota(engine, workers)} elevadores.")
+    except Exception as e:
+        print(f"Erro na pontuação de anomalias da frota: {e}")
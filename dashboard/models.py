@@ -1,4 +1,5 @@
 from extensions import db
+from sqlalchemy.orm import declared_attr
 from datetime import datetime
 
 class Tecnico(db.Model):
@@ -18,8 +19,11 @@ class Elevador(db.Model):
     criado_em = db.Column(db.DateTime, default=datetime.utcnow)
     tecnico_id = db.Column(db.String(100), db.ForeignKey('tecnico.id'), nullable=False)
     historico = db.relationship('Historico', backref='elevador', lazy=True, cascade="all, delete-orphan")
-    logs_sensores = db.relationship('SensorLog', backref='elevador', lazy=True, cascade="all, delete-orphan")
+    logs_sensores = db.relationship('SensorLog', backref='elevador', lazy=True, passive_deletes='all')
     analises_diarias = db.relationship('AnaliseDiaria', backref='elevador', lazy=True, cascade="all, delete-orphan")
+    estatisticas_sensores = db.relationship('EstatisticaSensor', backref='elevador', lazy=True, cascade="all, delete-orphan")
+    eventos_anomalia = db.relationship('EventoAnomalia', backref='elevador', lazy=True, cascade="all, delete-orphan")
+    pontuacao_frota = db.relationship('PontuacaoFrota', backref='elevador', lazy=True, uselist=False, cascade="all, delete-orphan")
 
 class Historico(db.Model):
     id = db.Column(db.String(100), primary_key=True)
@@ -27,6 +31,7 @@ class Historico(db.Model):
     mensagem = db.Column(db.String(255), nullable=False)
     tecnico_username = db.Column(db.String(80), nullable=False)
     elevador_id = db.Column(db.String(100), db.ForeignKey('elevador.id'), nullable=False)
+    __table_args__ = (db.Index('ix_historico_elevador_ts', 'elevador_id', 'ts', 'id'),)
 
 class SensorLog(db.Model):
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
@@ -37,6 +42,10 @@ class SensorLog(db.Model):
     tensao = db.Column(db.Float)
     velocidade = db.Column(db.Float)
     elevador_id = db.Column(db.String(100), db.ForeignKey('elevador.id'), nullable=False)
+    __table_args__ = (
+        db.Index('ix_sensor_log_elevador_ts', 'elevador_id', 'ts'),
+        db.Index('ix_sensor_log_ts', 'ts'),
+    )
 
 class AnaliseDiaria(db.Model):
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
@@ -51,3 +60,71 @@ class AnaliseDiaria(db.Model):
     picos_corrente_alta = db.Column(db.Integer)
     leituras_totais = db.Column(db.Integer)
     elevador_id = db.Column(db.String(100), db.ForeignKey('elevador.id'), nullable=False)
+    __table_args__ = (db.Index('uq_analise_diaria_elevador_data', 'elevador_id', 'data_referencia', unique=True),)
+
+class CheckpointJob(db.Model):
+    nome = db.Column(db.String(50), primary_key=True)
+    ultima_data = db.Column(db.DateTime, nullable=False)
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class PontuacaoFrota(db.Model):
+    elevador_id = db.Column(db.String(100), db.ForeignKey('elevador.id'), primary_key=True)
+    data_referencia = db.Column(db.DateTime, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+    desvio_max = db.Column(db.Float)
+    anomalia = db.Column(db.Boolean, nullable=False, default=False)
+    calculado_em = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (db.Index('ix_pontuacao_frota_score', 'score'),)
+
+class EventoAnomalia(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    ts = db.Column(db.DateTime, nullable=False)
+    campo = db.Column(db.String(20), nullable=False)
+    detector = db.Column(db.String(20), nullable=False)
+    valor = db.Column(db.Float, nullable=False)
+    referencia = db.Column(db.Float)
+    limite = db.Column(db.Float)
+    z = db.Column(db.Float)
+    elevador_id = db.Column(db.String(100), db.ForeignKey('elevador.id'), nullable=False)
+    __table_args__ = (db.Index('ix_evento_anomalia_elevador_ts', 'elevador_id', 'ts'),)
+
+class EstatisticaSensor(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    campo = db.Column(db.String(20), nullable=False)
+    n = db.Column(db.Integer, nullable=False, default=0)
+    media = db.Column(db.Float)
+    m2 = db.Column(db.Float)
+    minimo = db.Column(db.Float)
+    ts_minimo = db.Column(db.DateTime)
+    maximo = db.Column(db.Float)
+    ts_maximo = db.Column(db.DateTime)
+    inicio = db.Column(db.DateTime)
+    fim = db.Column(db.DateTime)
+    quantil = db.Column(db.Text)
+    elevador_id = db.Column(db.String(100), db.ForeignKey('elevador.id'), nullable=False)
+    __table_args__ = (db.UniqueConstraint('elevador_id', 'campo'),)
+
+class RollupSensorMixin:
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    inicio = db.Column(db.DateTime, nullable=False)
+    campo = db.Column(db.String(20), nullable=False)
+    n = db.Column(db.Integer, nullable=False, default=0)
+    soma = db.Column(db.Float, nullable=False, default=0.0)
+    minimo = db.Column(db.Float)
+    maximo = db.Column(db.Float)
+
+    @declared_attr
+    def elevador_id(cls):
+        return db.Column(db.String(100), db.ForeignKey('elevador.id'), nullable=False)
+
+class SensorRollup1m(RollupSensorMixin, db.Model):
+    __tablename__ = 'sensor_rollup_1m'
+    __table_args__ = (db.UniqueConstraint('elevador_id', 'inicio', 'campo'),)
+
+class SensorRollup1h(RollupSensorMixin, db.Model):
+    __tablename__ = 'sensor_rollup_1h'
+    __table_args__ = (db.UniqueConstraint('elevador_id', 'inicio', 'campo'),)
+
+class SensorRollup1d(RollupSensorMixin, db.Model):
+    __tablename__ = 'sensor_rollup_1d'
+    __table_args__ = (db.UniqueConstraint('elevador_id', 'inicio', 'campo'),)
@@ -0,0 +1,182 @@
+import threading
+
+MODOS = ('bruto', 'agregado', 'lttb')
+CAMPOS_AGREGADOS = ['ia', 'temp_c', 'vib_s1_ms2']
+JANELA_MAX_S = 60
+
+def normalizar_modo(modo, janela=None, campo=None):
+    if modo not in MODOS or modo == 'bruto':
+        return None
+    try:
+        janela = int(janela or 1)
+    except (TypeError, ValueError):
+        janela = 1
+    janela = max(1, min(JANELA_MAX_S, janela))
+    if modo == 'lttb':
+        return (modo, janela, campo if campo in CAMPOS_AGREGADOS else 'ia')
+    return (modo, janela, None)
+
+class AgregadorJanela:
+    def __init__(self, janela_s):
+        self.janela_ms = janela_s * 1000
+        self.inicio = None
+        self.ultima = None
+        self.n = 0
+        self.estatisticas = {}
+
+    def adicionar(self, leitura):
+        t = leitura['t']
+        bucket = t - t % self.janela_ms
+        frame = None
+        if self.inicio is not None and bucket != self.inicio:
+            frame = self.fechar()
+        if self.inicio is None:
+            self.inicio = bucket
+
+        self.n += 1
+        self.ultima = leitura
+        for campo in CAMPOS_AGREGADOS:
+            valor = leitura.get(campo)
+            if not isinstance(valor, (int, float)):
+                continue
+            stats = self.estatisticas.get(campo)
+            if stats is None:
+                self.estatisticas[campo] = [valor, valor, valor, 1]
+            else:
+                stats[0] = min(stats[0], valor)
+                stats[1] = max(stats[1], valor)
+                stats[2] += valor
+                stats[3] += 1
+        return frame
+
+    def expirado(self, agora_ms):
+        return self.inicio is not None and agora_ms >= self.inicio + self.janela_ms
+
+    def fechar(self):
+        if self.inicio is None:
+            return None
+        frame = dict(self.ultima)
+        frame.update(tipo='agregado', t=self.inicio, janela_s=self.janela_ms // 1000, n=self.n)
+        for campo, (minimo, maximo, soma, contagem) in self.estatisticas.items():
+            frame[campo] = soma / contagem
+            frame[f"{campo}_min"] = minimo
+            frame[f"{campo}_max"] = maximo
+        self.inicio = None
+        self.ultima = None
+        self.n = 0
+        self.estatisticas = {}
+        return frame
+
+class DecimadorLTTB:
+    def __init__(self, janela_s, campo):
+        self.janela_ms = janela_s * 1000
+        self.campo = campo
+        self.anterior = None
+        self.inicio = None
+        self.bucket = []
+        self.pendente = []
+
+    def _ponto(self, leitura):
+        valor = leitura.get(self.campo)
+        return leitura['t'], float(valor) if isinstance(valor, (int, float)) else 0.0
+
+    def _selecionar(self, candidatos, proximo):
+        (ta, ya), (tc, yc) = self._ponto(self.anterior), proximo
+        melhor, maior_area = candidatos[0], -1.0
+        for leitura in candidatos:
+            tb, yb = self._ponto(leitura)
+            area = abs((ta - tc) * (yb - ya) - (ta - tb) * (yc - ya))
+            if area > maior_area:
+                melhor, maior_area = leitura, area
+        self.anterior = melhor
+        return dict(melhor, tipo='lttb', janela_s=self.janela_ms // 1000)
+
+    def _media(self, leituras):
+        pontos = [self._ponto(l) for l in leituras]
+        return sum(p[0] for p in pontos) / len(pontos), sum(p[1] for p in pontos) / len(pontos)
+
+    def adicionar(self, leitura):
+        if self.anterior is None:
+            self.anterior = leitura
+            return dict(leitura, tipo='lttb', janela_s=self.janela_ms // 1000)
+
+        t = leitura['t']
+        bucket = t - t % self.janela_ms
+        frame = None
+        if self.inicio is not None and bucket != self.inicio:
+            frame = self._fechar_bucket()
+        self.inicio = bucket
+        self.bucket.append(leitura)
+        return frame
+
+    def _fechar_bucket(self):
+        frame = None
+        if self.pendente:
+            frame = self._selecionar(self.pendente, self._media(self.bucket))
+        self.pendente, self.bucket = self.bucket, []
+        self.inicio = None
+        return frame
+
+    def expirado(self, agora_ms):
+        if self.inicio is not None:
+            return agora_ms >= self.inicio + self.janela_ms
+        return bool(self.pendente) and agora_ms >= self.pendente[-1]['t'] + 2 * self.janela_ms
+
+    def fechar(self):
+        if self.bucket:
+            return self._fechar_bucket()
+        frame = self._selecionar(self.pendente, self._ponto(self.pendente[-1]))
+        self.pendente = []
+        return frame
+
+class GerenciadorModos:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ativos = {}
+        self._estados = {}
+
+    def ativar(self, chave):
+        with self._lock:
+            self._ativos[chave] = self._ativos.get(chave, 0) + 1
+
+    def desativar(self, chave):
+        with self._lock:
+            restantes = self._ativos.get(chave, 0) - 1
+            if restantes > 0:
+                self._ativos[chave] = restantes
+            else:
+                self._ativos.pop(chave, None)
+                self._estados.pop(chave, None)
+
+    def _novo_estado(self, chave):
+        modo, janela, campo = chave
+        if modo == 'lttb':
+            return DecimadorLTTB(janela, campo)
+        return AgregadorJanela(janela)
+
+    def processar(self, leitura, elevador_id):
+        frames = []
+        with self._lock:
+            for chave in self._ativos:
+                por_elevador = self._estados.setdefault(chave, {})
+                estado = por_elevador.get(elevador_id)
+                if estado is None:
+                    estado = por_elevador[elevador_id] = self._novo_estado(chave)
+                frame = estado.adicionar(leitura)
+                if frame is not None:
+                    frames.append((chave, elevador_id, frame))
+        return frames
+
+    def expirar(self, agora_ms):
+        frames = []
+        with self._lock:
+            for chave, por_elevador in self._estados.items():
+                for elevador_id, estado in por_elevador.items():
+                    if estado.expirado(agora_ms):
+                        frame = estado.fechar()
+                        if frame is not None:
+                            frames.append((chave, elevador_id, frame))
+        return frames
+
+    def tem_ativos(self):
+        return bool(self._ativos)
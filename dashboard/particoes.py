@@ -0,0 +1,109 @@
+import re
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, text
+
+TABELA_QUENTE = 'sensor_log'
+VISAO_COMPLETA = 'sensor_log_completo'
+PREFIXO = 'sensor_log_p'
+MESES_NA_TABELA_QUENTE = 2
+
+def nome_particao(ano, mes):
+    return f"{PREFIXO}{ano:04d}{mes:02d}"
+
+def _limites_mes(ano, mes):
+    inicio = datetime(ano, mes, 1)
+    fim = datetime(ano + (mes == 12), mes % 12 + 1, 1)
+    return inicio, fim
+
+def listar_particoes(conexao):
+    nomes = conexao.execute(text(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE :prefixo ORDER BY name"
+    ), {'prefixo': PREFIXO + '%'}).scalars()
+    return [n for n in nomes if re.fullmatch(PREFIXO + r'\d{6}', n)]
+
+def tabela_historico(conexao):
+    existe = conexao.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'view' AND name = :nome"
+    ), {'nome': VISAO_COMPLETA}).scalar()
+    return VISAO_COMPLETA if existe else TABELA_QUENTE
+
+def recriar_visao(conexao):
+    selects = [f"SELECT id, ts, ia, temp_c, vib_s1_ms2, tensao, velocidade, elevador_id FROM {t}"
+               for t in [TABELA_QUENTE] + listar_particoes(conexao)]
+    conexao.execute(text(f"DROP VIEW IF EXISTS {VISAO_COMPLETA}"))
+    conexao.execute(text(f"CREATE VIEW {VISAO_COMPLETA} AS " + " UNION ALL ".join(selects)))
+
+def criar_particao(conexao, ano, mes):
+    nome = nome_particao(ano, mes)
+    conexao.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {nome} (
+            id INTEGER NOT NULL PRIMARY KEY,
+            ts DATETIME,
+            ia FLOAT,
+            temp_c FLOAT,
+            vib_s1_ms2 FLOAT,
+            tensao FLOAT,
+            velocidade FLOAT,
+            elevador_id VARCHAR(100) NOT NULL
+        )
+    """))
+    conexao.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{nome}_elevador_ts ON {nome} (elevador_id, ts)"))
+    return nome
+
+def arquivar_mes(engine, ano, mes):
+    inicio, fim = _limites_mes(ano, mes)
+    with engine.begin() as conexao:
+        nome = criar_particao(conexao, ano, mes)
+
+    movidas = 0
+    dia = inicio
+    while dia < fim:
+        proximo = min(dia + timedelta(days=1), fim)
+        with engine.begin() as conexao:
+            filtro = {'inicio': str(dia), 'fim': str(proximo)}
+            conexao.execute(text(
+                f"INSERT INTO {nome} SELECT id, ts, ia, temp_c, vib_s1_ms2, tensao, velocidade, elevador_id "
+                f"FROM {TABELA_QUENTE} WHERE ts >= :inicio AND ts < :fim"
+            ), filtro)
+            movidas += conexao.execute(text(
+                f"DELETE FROM {TABELA_QUENTE} WHERE ts >= :inicio AND ts < :fim"
+            ), filtro).rowcount
+        dia = proximo
+
+    with engine.begin() as conexao:
+        recriar_visao(conexao)
+    return movidas
+
+def arquivar_meses_fechados(engine, meses_na_tabela_quente=MESES_NA_TABELA_QUENTE):
+    hoje = datetime.now()
+    indice_corte = hoje.year * 12 + hoje.month - 1 - (meses_na_tabela_quente - 1)
+    with engine.connect() as conexao:
+        mais_antigo = conexao.execute(text(f"SELECT MIN(ts) FROM {TABELA_QUENTE}")).scalar()
+    if mais_antigo is None:
+        return {}
+
+    mais_antigo = datetime.fromisoformat(str(mais_antigo))
+    indice = mais_antigo.year * 12 + mais_antigo.month - 1
+    resultado = {}
+    while indice < indice_corte:
+        ano, mes = divmod(indice, 12)
+        resultado[nome_particao(ano, mes + 1)] = arquivar_mes(engine, ano, mes + 1)
+        indice += 1
+    return resultado
+
+def descartar_particao(conexao, ano, mes):
+    nome = nome_particao(ano, mes)
+    conexao.execute(text(f"DROP TABLE IF EXISTS {nome}"))
+    recriar_visao(conexao)
+
+def remover_elevador(conexao, elevador_id):
+    for nome in [TABELA_QUENTE] + listar_particoes(conexao):
+        conexao.execute(text(f"DELETE FROM {nome} WHERE elevador_id = :e"), {'e': elevador_id})
+
+def rodar_manutencao(db_uri):
+    engine = create_engine(db_uri)
+    try:
+        movidas = arquivar_meses_fechados(engine)
+        print(f"Manutenção de partições concluída: {movidas or 'nada a arquivar'}")
+    except Exception as e:
+        print(f"Erro na manutenção de partições: {e}")
@@ -0,0 +1,111 @@
+import queue
+import threading
+import time
+from sqlalchemy import insert
+from api_server import app as app_api
+from extensions import db
+from models import Elevador, EventoAnomalia
+from ingestao import buffer_sensores, linha_sensor, validar_eventos
+from instrumentacao import telemetria
+
+class EtapaPersistencia:
+    def __init__(self, nome, gravar, max_fila=10000, max_lote=500, intervalo_s=0.2):
+        self.nome = nome
+        self.gravar = gravar
+        self.max_lote = max_lote
+        self.intervalo_s = intervalo_s
+        self._fila = queue.Queue(maxsize=max_fila)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.contadores = {
+            'enfileirados': 0,
+            'descartados_fila_cheia': 0,
+            'enviados': 0,
+            'rejeitados': 0,
+            'erros': 0,
+            'ultima_latencia_ms': 0.0
+        }
+
+    def iniciar(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name=f"pipeline-{self.nome}", daemon=True)
+                self._thread.start()
+
+    def enfileirar(self, item):
+        if self._thread is None:
+            self.iniciar()
+        try:
+            self._fila.put_nowait(item)
+        except queue.Full:
+            self.contadores['descartados_fila_cheia'] += 1
+            return False
+        self.contadores['enfileirados'] += 1
+        return True
+
+    def _coletar_lote(self):
+        try:
+            lote = [self._fila.get(timeout=self.intervalo_s)]
+        except queue.Empty:
+            return []
+        while len(lote) < self.max_lote:
+            try:
+                lote.append(self._fila.get_nowait())
+            except queue.Empty:
+                break
+        return lote
+
+    def _loop(self):
+        while True:
+            lote = self._coletar_lote()
+            if not lote:
+                continue
+            inicio = time.perf_counter()
+            try:
+                with app_api.app_context():
+                    aceitos = self.gravar(lote)
+            except Exception as e:
+                self.contadores['erros'] += len(lote)
+                print(f"Erro na etapa '{self.nome}' do pipeline: {e}")
+                continue
+            self.contadores['ultima_latencia_ms'] = (time.perf_counter() - inicio) * 1000.0
+            telemetria.observar(f"pipeline_{self.nome}", inicio)
+            self.contadores['enviados'] += aceitos
+            self.contadores['rejeitados'] += len(lote) - aceitos
+
+    def metricas(self):
+        metricas = dict(self.contadores)
+        metricas['profundidade_fila'] = self._fila.qsize()
+        metricas['buffer_ingestao'] = buffer_sensores.metricas()
+        return metricas
+
+def gravar_leituras(lote):
+    existentes = buffer_sensores.filtrar_existentes(item.get('elevador_id') for item in lote)
+    aceitos = 0
+    for item in lote:
+        elevador_id = item.get('elevador_id')
+        if not isinstance(elevador_id, str) or elevador_id not in existentes:
+            continue
+        try:
+            linha = linha_sensor(elevador_id, item)
+        except ValueError:
+            continue
+        buffer_sensores.adicionar(linha)
+        aceitos += 1
+    return aceitos
+
+def gravar_eventos(lote):
+    existentes = buffer_sensores.filtrar_existentes(item.get('elevador_id') for item in lote)
+    linhas = validar_eventos(lote, existentes)
+    if linhas:
+        db.session.execute(insert(EventoAnomalia), linhas)
+        db.session.commit()
+    return len(linhas)
+
+def elevador_existe(elevador_id):
+    with app_api.app_context():
+        return bool(buffer_sensores.filtrar_existentes([elevador_id]))
+
+def elevadores_do_predio(predio):
+    with app_api.app_context():
+        return [e.id for e in db.session.query(Elevador.id).filter_by(predio=predio).all()]
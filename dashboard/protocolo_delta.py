@@ -0,0 +1,104 @@
+import math
+import struct
+import zlib
+
+VERSAO = 1
+COMPRESSOES = ('deflate',)
+CAMPOS = ['ia', 'temp_c', 'vib_s1_ms2', 'velocidade', 'tensao', 'estado', 'dist_l1', 'dist_l2', 'dist_o1', 'dist_o2', 'altura']
+ESCALAS = [100, 100, 1000, 1000, 100, 1, 10, 10, 10, 10, 1000]
+FRAME_REGISTRO, FRAME_COMPLETO, FRAME_DELTA = 1, 2, 3
+MAX_ELEVADORES = 65535
+
+_u16 = struct.Struct('<H')
+
+def _varint(valor, saida):
+    while valor >= 0x80:
+        saida.append((valor & 0x7F) | 0x80)
+        valor >>= 7
+    saida.append(valor)
+
+def _zigzag(valor):
+    return (valor << 1) ^ (valor >> 63)
+
+def _quantizar(leitura):
+    valores = []
+    for campo, escala in zip(CAMPOS, ESCALAS):
+        valor = leitura.get(campo)
+        if isinstance(valor, bool) or not isinstance(valor, (int, float)) or not math.isfinite(valor):
+            valores.append(None)
+        else:
+            valores.append(round(valor * escala))
+    return valores
+
+def normalizar_protocolo(protocolo, compressao=None):
+    if protocolo != 'delta':
+        return None
+    return ('delta', compressao if compressao in COMPRESSOES else None)
+
+class CodificadorDelta:
+    def __init__(self, compressao=None):
+        self.compressao = compressao
+        self._compressor = zlib.compressobj(1, zlib.DEFLATED, -15) if compressao == 'deflate' else None
+        self._indices = {}
+        self._anteriores = {}
+
+    def esquema(self):
+        return {
+            'tipo': 'esquema', 'protocolo': 'delta', 'versao': VERSAO, 'compressao': self.compressao,
+            'campos': CAMPOS, 'escalas': ESCALAS,
+            'frames': {'registro': FRAME_REGISTRO, 'completo': FRAME_COMPLETO, 'delta': FRAME_DELTA}
+        }
+
+    def _frame(self, corpo, saida):
+        saida += _u16.pack(len(corpo))
+        saida += corpo
+
+    def _indice(self, elevador_id, saida):
+        indice = self._indices.get(elevador_id)
+        if indice is None:
+            if len(self._indices) >= MAX_ELEVADORES:
+                self._indices.clear()
+                self._anteriores.clear()
+            indice = self._indices[elevador_id] = len(self._indices)
+            id_bytes = elevador_id.encode('utf-8')
+            corpo = bytearray([FRAME_REGISTRO])
+            corpo += _u16.pack(indice)
+            _varint(len(id_bytes), corpo)
+            corpo += id_bytes
+            self._frame(corpo, saida)
+        return indice
+
+    def codificar(self, leitura, saida):
+        elevador_id = str(leitura.get('id_elevador') or '')
+        indice = self._indice(elevador_id, saida)
+        t = int(leitura.get('t') or 0)
+        valores = _quantizar(leitura)
+        anterior = self._anteriores.get(indice)
+
+        if anterior is None or any(v is None and a is not None for v, a in zip(valores, anterior[1])):
+            corpo = bytearray([FRAME_COMPLETO])
+            corpo += _u16.pack(indice)
+            _varint(t, corpo)
+            mascara, partes = 0, bytearray()
+            for i, valor in enumerate(valores):
+                if valor is not None:
+                    mascara |= 1 << i
+                    _varint(_zigzag(valor), partes)
+        else:
+            corpo = bytearray([FRAME_DELTA])
+            corpo += _u16.pack(indice)
+            _varint(_zigzag(t - anterior[0]), corpo)
+            mascara, partes = 0, bytearray()
+            for i, (valor, antes) in enumerate(zip(valores, anterior[1])):
+                if valor is not None and valor != antes:
+                    mascara |= 1 << i
+                    _varint(_zigzag(valor - (antes or 0)), partes)
+        corpo += _u16.pack(mascara)
+        corpo += partes
+        self._anteriores[indice] = (t, valores)
+        self._frame(corpo, saida)
+
+    def finalizar(self, saida):
+        if self._compressor is not None:
+            return self._compressor.compress(bytes(saida)) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        return bytes(saida)
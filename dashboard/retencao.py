@@ -0,0 +1,142 @@
+import re
+import time
+import argparse
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import CheckpointJob, SensorRollup1m
+import particoes
+import rollups
+
+DIAS_RETENCAO_BRUTO = 180
+DIAS_RETENCAO_1M = 400
+TAMANHO_LOTE = 5000
+PAUSA_ENTRE_LOTES_S = 0.05
+PAGINAS_POR_VACUUM = 2000
+NOME_JOB = 'retencao_sensor_log'
+
+def _proximo_mes(dia):
+    return datetime(dia.year + (dia.month == 12), dia.month % 12 + 1, 1)
+
+def leitura_mais_antiga(conexao):
+    mais_antigas = [conexao.execute(text(f"SELECT MIN(ts) FROM {nome}")).scalar()
+                    for nome in [particoes.TABELA_QUENTE] + particoes.listar_particoes(conexao)]
+    mais_antigas = [datetime.fromisoformat(str(ts)) for ts in mais_antigas if ts is not None]
+    return min(mais_antigas) if mais_antigas else None
+
+def ler_checkpoint(engine):
+    with engine.connect() as conexao:
+        valor = conexao.execute(text("SELECT ultima_data FROM checkpoint_job WHERE nome = :nome"), {'nome': NOME_JOB}).scalar()
+    return datetime.fromisoformat(str(valor)) if valor else None
+
+def salvar_checkpoint(conexao, dia):
+    comando = sqlite_insert(CheckpointJob.__table__).values(nome=NOME_JOB, ultima_data=dia, atualizado_em=datetime.utcnow())
+    comando = comando.on_conflict_do_update(
+        index_elements=['nome'],
+        set_={'ultima_data': text("max(ultima_data, excluded.ultima_data)"), 'atualizado_em': comando.excluded.atualizado_em})
+    conexao.execute(comando)
+
+def compactar_ate(engine, corte, pausa_s=PAUSA_ENTRE_LOTES_S):
+    with engine.connect() as conexao:
+        mais_antiga = leitura_mais_antiga(conexao)
+    if mais_antiga is None or mais_antiga >= corte:
+        return 0
+
+    inicio = rollups.inicio_bucket(mais_antiga, 86400)
+    ja_compactado = ler_checkpoint(engine)
+    if ja_compactado is not None:
+        inicio = max(inicio, ja_compactado)
+    dias = 0
+    while inicio < corte:
+        fim = min(inicio + timedelta(days=1), corte)
+        with engine.begin() as conexao:
+            rollups.compactar_periodo(conexao, inicio, fim)
+            salvar_checkpoint(conexao, fim)
+        dias += 1
+        inicio = fim
+        time.sleep(pausa_s)
+    return dias
+
+def descartar_particoes_expiradas(engine, corte):
+    descartadas = []
+    with engine.begin() as conexao:
+        for nome in particoes.listar_particoes(conexao):
+            ano, mes = int(nome[-6:-2]), int(nome[-2:])
+            if _proximo_mes(datetime(ano, mes, 1)) <= corte:
+                particoes.descartar_particao(conexao, ano, mes)
+                descartadas.append(nome)
+    return descartadas
+
+def remover_em_lotes(engine, tabela, coluna, corte, tamanho_lote=TAMANHO_LOTE, pausa_s=PAUSA_ENTRE_LOTES_S):
+    if not re.fullmatch(r'\w+', tabela) or not re.fullmatch(r'\w+', coluna):
+        raise ValueError(f"Nome de tabela ou coluna inválido: {tabela}.{coluna}")
+    with engine.connect() as conexao:
+        elevador_ids = conexao.execute(text(
+            f"SELECT DISTINCT elevador_id FROM {tabela} WHERE {coluna} < :corte"
+        ), {'corte': str(corte)}).scalars().all()
+
+    removidas = 0
+    for elevador_id in elevador_ids:
+        while True:
+            with engine.begin() as conexao:
+                lote = conexao.execute(text(f"""
+                    DELETE FROM {tabela} WHERE rowid IN (
+                        SELECT rowid FROM {tabela} WHERE elevador_id = :e AND {coluna} < :corte LIMIT :lote
+                    )
+                """), {'e': elevador_id, 'corte': str(corte), 'lote': tamanho_lote}).rowcount
+            removidas += lote
+            if lote < tamanho_lote:
+                break
+            time.sleep(pausa_s)
+    return removidas
+
+def vacuum_incremental(engine, paginas=PAGINAS_POR_VACUUM, pausa_s=PAUSA_ENTRE_LOTES_S):
+    with engine.connect() as conexao:
+        if conexao.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 2:
+            return None
+        sqlite = conexao.connection.driver_connection
+        livres_inicio = livres = sqlite.execute("PRAGMA freelist_count").fetchone()[0]
+        while livres:
+            sqlite.executescript(f"PRAGMA incremental_vacuum({min(livres, paginas)});")
+            restantes = sqlite.execute("PRAGMA freelist_count").fetchone()[0]
+            if restantes >= livres:
+                break
+            livres = restantes
+            time.sleep(pausa_s)
+    return livres_inicio - livres
+
+def aplicar_retencao(engine, dias_bruto=DIAS_RETENCAO_BRUTO, dias_1m=DIAS_RETENCAO_1M, tamanho_lote=TAMANHO_LOTE):
+    agora = datetime.now()
+    corte = rollups.inicio_bucket(agora - timedelta(days=dias_bruto), 86400)
+    resumo = {'corte': corte.isoformat(), 'dias_compactados': compactar_ate(engine, corte)}
+    resumo['particoes_descartadas'] = descartar_particoes_expiradas(engine, corte)
+
+    with engine.connect() as conexao:
+        tabelas = [particoes.TABELA_QUENTE] + particoes.listar_particoes(conexao)
+    resumo['leituras_removidas'] = sum(remover_em_lotes(engine, tabela, 'ts', corte, tamanho_lote) for tabela in tabelas)
+
+    if dias_1m:
+        corte_1m = rollups.inicio_bucket(agora - timedelta(days=max(dias_1m, dias_bruto)), 86400)
+        resumo['rollups_1m_removidos'] = remover_em_lotes(engine, SensorRollup1m.__tablename__, 'inicio', corte_1m, tamanho_lote)
+
+    resumo['paginas_liberadas'] = vacuum_incremental(engine)
+    return resumo
+
+def rodar_retencao(db_uri, dias_bruto=DIAS_RETENCAO_BRUTO, dias_1m=DIAS_RETENCAO_1M):
+    engine = create_engine(db_uri)
+    try:
+        resumo = aplicar_retencao(engine, dias_bruto, dias_1m)
+        print(f"Retenção do sensor_log concluída: {resumo}")
+        return resumo
+    except Exception as e:
+        print(f"Erro na retenção do sensor_log: {e}")
+    finally:
+        engine.dispose()
+
+if __name__ == '__main__':
+    from api_server import DB_URI
+    parser = argparse.ArgumentParser(description="Compacta leituras antigas em rollups e remove o bruto expirado em lotes.")
+    parser.add_argument('--dias', type=int, default=DIAS_RETENCAO_BRUTO, help="dias de leituras brutas mantidas")
+    parser.add_argument('--dias-1m', type=int, default=DIAS_RETENCAO_1M, help="dias de rollups de 1 minuto mantidos (0 = para sempre)")
+    args = parser.parse_args()
+    rodar_retencao(DB_URI, args.dias, args.dias_1m)
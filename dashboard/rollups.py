@@ -0,0 +1,161 @@
+import math
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete, func, cast, type_coerce, table, column, Integer, Float, String, DateTime, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+import particoes
+from models import SensorRollup1m, SensorRollup1h, SensorRollup1d
+
+CAMPOS_ROLLUP = ['ia', 'temp_c', 'vib_s1_ms2', 'tensao', 'velocidade']
+RESOLUCOES = [(86400, SensorRollup1d), (3600, SensorRollup1h), (60, SensorRollup1m)]
+UNIDADES = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+MAX_PONTOS = 10000
+EPOCA = datetime(1970, 1, 1)
+
+def inicio_bucket(ts, resolucao_s):
+    segundos = int((ts - EPOCA).total_seconds())
+    return EPOCA + timedelta(seconds=segundos - segundos % resolucao_s)
+
+def interpretar_resolucao(valor):
+    valor = str(valor).strip().lower()
+    if valor[-1:] in UNIDADES:
+        return int(valor[:-1]) * UNIDADES[valor[-1]]
+    return int(valor)
+
+def atualizar(conexao, linhas):
+    for resolucao_s, modelo in RESOLUCOES:
+        agregados = {}
+        for linha in linhas:
+            inicio = inicio_bucket(linha['ts'], resolucao_s)
+            for campo in CAMPOS_ROLLUP:
+                valor = linha.get(campo)
+                if valor is None or isinstance(valor, bool):
+                    continue
+                try:
+                    valor = float(valor)
+                except (TypeError, ValueError):
+                    continue
+                if not math.isfinite(valor):
+                    continue
+                chave = (linha['elevador_id'], inicio, campo)
+                atual = agregados.get(chave)
+                if atual is None:
+                    agregados[chave] = [1, valor, valor, valor]
+                else:
+                    atual[0] += 1
+                    atual[1] += valor
+                    atual[2] = min(atual[2], valor)
+                    atual[3] = max(atual[3], valor)
+        if not agregados:
+            continue
+
+        tabela = modelo.__table__
+        comando = sqlite_insert(tabela)
+        comando = comando.on_conflict_do_update(
+            index_elements=['elevador_id', 'inicio', 'campo'],
+            set_={
+                'n': tabela.c.n + comando.excluded.n,
+                'soma': tabela.c.soma + comando.excluded.soma,
+                'minimo': func.min(tabela.c.minimo, comando.excluded.minimo),
+                'maximo': func.max(tabela.c.maximo, comando.excluded.maximo)
+            })
+        conexao.execute(comando, [
+            {'elevador_id': e, 'inicio': i, 'campo': c, 'n': n, 'soma': soma, 'minimo': minimo, 'maximo': maximo}
+            for (e, i, c), (n, soma, minimo, maximo) in agregados.items()
+        ])
+
+def escolher_fonte(resolucao_s):
+    for resolucao_tabela, modelo in RESOLUCOES:
+        if resolucao_tabela <= resolucao_s and resolucao_s % resolucao_tabela == 0:
+            return modelo
+    return None
+
+def _balde(coluna, resolucao_s):
+    return type_coerce(cast(func.strftime('%s', coluna), Integer) / resolucao_s * resolucao_s, Integer)
+
+def consultar(conexao, elevador_id, de, ate, resolucao_s):
+    de = inicio_bucket(de, resolucao_s)
+    modelo = escolher_fonte(resolucao_s)
+    pontos = {}
+
+    if modelo is not None:
+        tabela = modelo.__table__
+        balde = _balde(tabela.c.inicio, resolucao_s).label('balde')
+        consulta = (select(balde, tabela.c.campo, func.sum(tabela.c.n), func.sum(tabela.c.soma),
+                           func.min(tabela.c.minimo), func.max(tabela.c.maximo))
+                    .where(tabela.c.elevador_id == elevador_id, tabela.c.inicio >= de, tabela.c.inicio < ate)
+                    .group_by(balde, tabela.c.campo))
+        for balde_s, campo, n, soma, minimo, maximo in conexao.execute(consulta):
+            pontos.setdefault(balde_s, {})[campo] = (n, soma, minimo, maximo)
+        fonte = tabela.name
+    else:
+        tabela = table(particoes.tabela_historico(conexao), column('ts', DateTime), column('elevador_id', String),
+                       *[column(campo, Float) for campo in CAMPOS_ROLLUP])
+        balde = _balde(tabela.c.ts, resolucao_s).label('balde')
+        colunas = []
+        for campo in CAMPOS_ROLLUP:
+            coluna = tabela.c[campo]
+            colunas += [func.count(coluna), func.sum(coluna), func.min(coluna), func.max(coluna)]
+        consulta = (select(balde, *colunas)
+                    .where(tabela.c.elevador_id == elevador_id, tabela.c.ts >= de, tabela.c.ts < ate)
+                    .group_by(balde))
+        for linha in conexao.execute(consulta):
+            for i, campo in enumerate(CAMPOS_ROLLUP):
+                n, soma, minimo, maximo = linha[1 + 4 * i:5 + 4 * i]
+                if n:
+                    pontos.setdefault(linha[0], {})[campo] = (n, soma, minimo, maximo)
+        fonte = tabela.name
+
+    serie = []
+    for balde_s in sorted(pontos):
+        ponto = {'t': (EPOCA + timedelta(seconds=balde_s)).isoformat()}
+        for campo, (n, soma, minimo, maximo) in pontos[balde_s].items():
+            ponto[campo] = {'n': n, 'media': soma / n, 'min': minimo, 'max': maximo}
+        serie.append(ponto)
+    return fonte, serie
+
+def remover_elevador(conexao, elevador_id):
+    for _, modelo in RESOLUCOES:
+        conexao.execute(delete(modelo.__table__).where(modelo.__table__.c.elevador_id == elevador_id))
+
+def reconstruir(conexao, elevador_id=None):
+    filtro = "AND elevador_id = :e" if elevador_id else ""
+    tabela_leituras = particoes.tabela_historico(conexao)
+    for resolucao_s, modelo in RESOLUCOES:
+        tabela = modelo.__tablename__
+        conexao.execute(text(f"DELETE FROM {tabela} WHERE 1 = 1 {filtro}"), {'e': elevador_id})
+        for campo in CAMPOS_ROLLUP:
+            conexao.execute(text(f"""
+                INSERT INTO {tabela} (elevador_id, inicio, campo, n, soma, minimo, maximo)
+                SELECT elevador_id,
+                       datetime(CAST(strftime('%s', ts) AS INTEGER) / {resolucao_s} * {resolucao_s}, 'unixepoch') || '.000000',
+                       '{campo}', COUNT({campo}), SUM({campo}), MIN({campo}), MAX({campo})
+                FROM {tabela_leituras}
+                WHERE {campo} IS NOT NULL {filtro}
+                GROUP BY elevador_id, 2
+            """), {'e': elevador_id})
+
+def compactar_periodo(conexao, inicio, fim):
+    tabela_leituras = particoes.tabela_historico(conexao)
+    for resolucao_s, modelo in RESOLUCOES:
+        tabela = modelo.__tablename__
+        for campo in CAMPOS_ROLLUP:
+            conexao.execute(text(f"""
+                INSERT INTO {tabela} (elevador_id, inicio, campo, n, soma, minimo, maximo)
+                SELECT elevador_id,
+                       datetime(CAST(strftime('%s', ts) AS INTEGER) / {resolucao_s} * {resolucao_s}, 'unixepoch') || '.000000',
+                       '{campo}', COUNT({campo}), SUM({campo}), MIN({campo}), MAX({campo})
+                FROM {tabela_leituras}
+                WHERE {campo} IS NOT NULL AND ts >= :inicio AND ts < :fim
+                GROUP BY elevador_id, 2
+                ON CONFLICT (elevador_id, inicio, campo) DO NOTHING
+            """), {'inicio': str(inicio), 'fim': str(fim)})
+
+if __name__ == '__main__':
+    import sys
+    from api_server import app
+    from extensions import db
+    with app.app_context():
+        db.create_all()
+        with db.engine.begin() as conexao:
+            reconstruir(conexao, sys.argv[1] if len(sys.argv) > 1 else None)
+    print("Tabelas de rollup reconstruídas a partir de sensor_log.")
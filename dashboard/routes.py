@@ -1,15 +1,36 @@
 from flask import Blueprint, request, jsonify
+from sqlalchemy import insert, or_, and_
 from extensions import db
-from models import Tecnico, Elevador, Historico, SensorLog, AnaliseDiaria
+from models import Tecnico, Elevador, Historico, SensorLog, PontuacaoFrota, EventoAnomalia
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-from datetime import datetime
-import random, string
-import pandas as pd
-from sklearn.ensemble import IsolationForest
+from datetime import datetime, timedelta
+import random, string, base64, time
 import analysis_module
+from modelos_anomalia import registro_modelos
+from cache_respostas import cache_respostas
+from instrumentacao import telemetria, ENDERECOS_LOCAIS
+import rollups
+import particoes
+from ingestao import buffer_sensores, linha_sensor, expandir_lote, validar_lote, validar_eventos, gravar_leituras, MAX_LEITURAS_LOTE
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
+def ler_instante(valor, padrao):
+    if not valor:
+        return padrao
+    try:
+        return datetime.fromtimestamp(float(valor) / 1000.0)
+    except ValueError:
+        instante = datetime.fromisoformat(valor)
+        return instante.astimezone().replace(tzinfo=None) if instante.tzinfo else instante
+
+def codificar_cursor(log):
+    return base64.urlsafe_b64encode(f"{log.ts.isoformat()}|{log.id}".encode('utf-8')).decode('ascii')
+
+def ler_cursor(cursor):
+    ts, _, log_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').partition('|')
+    return datetime.fromisoformat(ts), log_id
+
 def uid():
     return ''.join(random.choices(string.ascii_lowercase + string.digits, k=10)) + str(int(datetime.now().timestamp() * 1000))
 
@@ -52,7 +73,9 @@ def login():
 def get_elevadores():
     identidade_tecnico = get_jwt_identity()
     tecnico_id = identidade_tecnico['id']
-        
+    return cache_respostas.responder(tecnico_id, ('lista',), lambda: listar_elevadores(tecnico_id))
+
+def listar_elevadores(tecnico_id):
     elevadores_db = Elevador.query.filter_by(tecnico_id=tecnico_id).all()
     
     lista_elevadores = []
@@ -62,7 +85,7 @@ def get_elevadores():
             "status": e.status, "manutencao": e.manutencao, "observacoes": e.observacoes,
             "tecnicoId": e.tecnico_id
         })
-    return jsonify(lista_elevadores)
+    return lista_elevadores
 
 @api_bp.route('/elevadores', methods=['POST'])
 @jwt_required()
@@ -93,6 +116,7 @@ def add_elevador():
     )
     db.session.add(primeiro_log)
     db.session.commit()
+    cache_respostas.invalidar(tecnico_id)
     
     return jsonify({"id": novo_elevador.id, "nome": novo_elevador.nome, "historico": []}), 201
 
@@ -100,14 +124,35 @@ def add_elevador():
 @jwt_required()
 def get_elevador_detalhe(id):
     identidade_tecnico = get_jwt_identity()
+    limite = request.args.get('limite', type=int)
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            cursor = ler_cursor(cursor)
+        except ValueError:
+            return jsonify({"status": "erro", "mensagem": "Cursor de paginação inválido"}), 400
+    if limite is not None or cursor:
+        limite = max(1, min(limite or 50, 500))
+    chave = ('detalhe', id, limite, cursor)
+    return cache_respostas.responder(identidade_tecnico['id'], chave,
+                                     lambda: detalhar_elevador(id, identidade_tecnico['id'], limite, cursor))
+
+def detalhar_elevador(id, tecnico_id, limite, cursor):
     elevador = Elevador.query.get(id)
     
     if not elevador:
         return jsonify({"mensagem": "Elevador não encontrado"}), 404
-    if elevador.tecnico_id != identidade_tecnico['id']:
+    if elevador.tecnico_id != tecnico_id:
         return jsonify({"mensagem": "Acesso não autorizado"}), 403
         
-    logs_db = Historico.query.filter_by(elevador_id=id).order_by(Historico.ts.desc()).all()
+    consulta = Historico.query.filter_by(elevador_id=id).order_by(Historico.ts.desc(), Historico.id.desc())
+    if cursor:
+        consulta = consulta.filter(or_(Historico.ts < cursor[0], and_(Historico.ts == cursor[0], Historico.id < cursor[1])))
+    logs_db = consulta.limit(limite + 1).all() if limite else consulta.all()
+    proximo_cursor = None
+    if limite and len(logs_db) > limite:
+        logs_db = logs_db[:limite]
+        proximo_cursor = codificar_cursor(logs_db[-1])
     logs_lista = [{
         "id": log.id,
         "ts": log.ts.isoformat(),
@@ -115,13 +160,16 @@ def get_elevador_detalhe(id):
         "tecnico": log.tecnico_username
     } for log in logs_db]
     
-    return jsonify({
+    detalhe = {
         "id": elevador.id, "nome": elevador.nome, "predio": elevador.predio, 
         "capacidade": elevador.capacidade, "status": elevador.status, 
         "manutencao": elevador.manutencao, "observacoes": elevador.observacoes,
         "tecnicoId": elevador.tecnico_id,
         "historico": logs_lista
-    })
+    }
+    if limite:
+        detalhe["proximoCursor"] = proximo_cursor
+    return detalhe
 
 @api_bp.route('/elevadores/<id>', methods=['PUT'])
 @jwt_required()
@@ -155,6 +203,7 @@ def update_elevador(id):
         db.session.add(log)
         
     db.session.commit()
+    cache_respostas.invalidar(identidade_tecnico['id'])
     return jsonify({"mensagem": "Elevador atualizado com sucesso!"})
 
 @api_bp.route('/elevadores/<id>', methods=['DELETE'])
@@ -168,32 +217,109 @@ def delete_elevador(id):
     if elevador.tecnico_id != identidade_tecnico['id']:
         return jsonify({"mensagem": "Acesso não autorizado"}), 403
         
+    buffer_sensores.esquecer_elevador(id)
+    rollups.remover_elevador(db.session.connection(), id)
+    particoes.remover_elevador(db.session.connection(), id)
     db.session.delete(elevador)
     db.session.commit()
+    registro_modelos.remover(id)
+    cache_respostas.invalidar(identidade_tecnico['id'])
     return jsonify({"mensagem": "Elevador excluído com sucesso!"})
 
+@api_bp.route('/predios/elevadores', methods=['GET'])
+def get_elevadores_predio():
+    if request.remote_addr not in ENDERECOS_LOCAIS:
+        return jsonify({"status": "erro", "mensagem": "Acesso não autorizado"}), 403
+    predio = request.args.get('predio')
+    if not predio:
+        return jsonify({"status": "erro", "mensagem": "Parâmetro 'predio' é obrigatório"}), 400
+    elevadores = db.session.query(Elevador.id).filter_by(predio=predio).all()
+    return jsonify({"predio": predio, "elevadores": [e.id for e in elevadores]})
+
 @api_bp.route('/log_sensor/<elevador_id>', methods=['POST'])
 def log_sensor_data(elevador_id):
-    elevador = Elevador.query.get(elevador_id)
-    if not elevador:
+    if not buffer_sensores.elevador_existe(elevador_id):
         return jsonify({"status": "erro", "mensagem": "ID do elevador não encontrado"}), 404
         
-    data = request.json
-    
-    novo_log = SensorLog(
-        ts=datetime.fromtimestamp(data.get('t', 0) / 1000.0),
-        ia=data.get('ia'),
-        temp_c=data.get('temp_c'),
-        vib_s1_ms2=data.get('vib_s1_ms2'),
-        tensao=data.get('tensao'),
-        velocidade=data.get('velocidade'),
-        elevador_id=elevador_id
-    )
+    try:
+        linha = linha_sensor(elevador_id, request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"status": "erro", "mensagem": str(e)}), 400
+    buffer_sensores.adicionar(linha)
     
-    db.session.add(novo_log)
-    db.session.commit()
+    return jsonify({"status": "sucesso"}), 202
+
+@api_bp.route('/log_sensor/batch', methods=['POST'])
+def log_sensor_batch():
+    try:
+        itens = expandir_lote(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"status": "erro", "mensagem": str(e)}), 400
+
+    if not itens:
+        return jsonify({"status": "erro", "mensagem": "Nenhuma leitura recebida"}), 400
+    if len(itens) > MAX_LEITURAS_LOTE:
+        return jsonify({"status": "erro", "mensagem": f"O lote excede o limite de {MAX_LEITURAS_LOTE} leituras."}), 413
+
+    existentes = buffer_sensores.filtrar_existentes(i.get('elevador_id') for i in itens if isinstance(i, dict))
+    linhas, resultados = validar_lote(itens, existentes)
+
+    inicio = time.perf_counter()
+    try:
+        linhas = gravar_leituras(linhas)
+        db.session.commit()
+        telemetria.observar('log_sensor_batch_commit', inicio)
+    except Exception as e:
+        db.session.rollback()
+        print(f"Erro ao gravar lote de leituras: {e}")
+        return jsonify({"status": "erro", "mensagem": f"Erro ao gravar lote: {e}"}), 500
+
+    rejeitadas = len(resultados) - len(linhas)
+    return jsonify({
+        "status": "sucesso" if not rejeitadas else "parcial",
+        "inseridas": len(linhas),
+        "rejeitadas": rejeitadas,
+        "resultados": resultados
+    }), 201 if linhas else 400
+
+@api_bp.route('/eventos_anomalia/batch', methods=['POST'])
+def log_eventos_anomalia():
+    dados = request.get_json(silent=True)
+    itens = dados.get('eventos') if isinstance(dados, dict) else dados
+    if not isinstance(itens, list) or not itens:
+        return jsonify({"status": "erro", "mensagem": "Nenhum evento recebido"}), 400
+    if len(itens) > MAX_LEITURAS_LOTE:
+        return jsonify({"status": "erro", "mensagem": f"O lote excede o limite de {MAX_LEITURAS_LOTE} eventos."}), 413
+
+    existentes = buffer_sensores.filtrar_existentes(i.get('elevador_id') for i in itens if isinstance(i, dict))
+    linhas = validar_eventos(itens, existentes)
+    if linhas:
+        db.session.execute(insert(EventoAnomalia), linhas)
+        db.session.commit()
+    return jsonify({"status": "sucesso", "inseridas": len(linhas), "rejeitadas": len(itens) - len(linhas)}), 201
+
+@api_bp.route('/eventos_anomalia/<elevador_id>', methods=['GET'])
+@jwt_required()
+def get_eventos_anomalia(elevador_id):
+    identidade_tecnico = get_jwt_identity()
+    elevador = Elevador.query.get(elevador_id)
     
-    return jsonify({"status": "sucesso"}), 201
+    if not elevador:
+        return jsonify({"status": "erro", "mensagem": "ID do elevador não encontrado"}), 404
+    if elevador.tecnico_id != identidade_tecnico['id']:
+        return jsonify({"mensagem": "Acesso não autorizado"}), 403
+
+    limite = min(request.args.get('limite', 100, type=int), 1000)
+    eventos = (EventoAnomalia.query.filter_by(elevador_id=elevador_id)
+               .order_by(EventoAnomalia.ts.desc()).limit(limite).all())
+    return jsonify([{
+        "ts": e.ts.isoformat(), "campo": e.campo, "detector": e.detector, "valor": e.valor,
+        "referencia": e.referencia, "limite": e.limite, "z": e.z
+    } for e in eventos])
+
+@api_bp.route('/ingestao/metricas', methods=['GET'])
+def get_metricas_ingestao():
+    return jsonify(buffer_sensores.metricas())
 
 @api_bp.route('/analise/<elevador_id>', methods=['GET'])
 @jwt_required()
@@ -214,6 +340,36 @@ def get_analise_elevador(elevador_id):
     
     return jsonify(report), 200
 
+@api_bp.route('/historico_sensor/<elevador_id>', methods=['GET'])
+@jwt_required()
+def get_historico_sensor(elevador_id):
+    identidade_tecnico = get_jwt_identity()
+    elevador = Elevador.query.get(elevador_id)
+    
+    if not elevador:
+        return jsonify({"status": "erro", "mensagem": "ID do elevador não encontrado"}), 404
+    if elevador.tecnico_id != identidade_tecnico['id']:
+        return jsonify({"mensagem": "Acesso não autorizado"}), 403
+
+    try:
+        ate = ler_instante(request.args.get('to'), datetime.now())
+        de = ler_instante(request.args.get('from'), ate - timedelta(hours=24))
+        resolucao_s = rollups.interpretar_resolucao(request.args.get('resolution', '1m'))
+    except (ValueError, OverflowError, OSError):
+        return jsonify({"status": "erro", "mensagem": "Parâmetros 'from', 'to' ou 'resolution' inválidos"}), 400
+
+    if resolucao_s <= 0 or de >= ate:
+        return jsonify({"status": "erro", "mensagem": "Intervalo ou resolução inválidos"}), 400
+    if (ate - de).total_seconds() / resolucao_s > rollups.MAX_PONTOS:
+        return jsonify({"status": "erro", "mensagem": f"A consulta excede {rollups.MAX_PONTOS} pontos; aumente a resolução."}), 400
+
+    fonte, pontos = rollups.consultar(db.session.connection(), elevador_id, de, ate, resolucao_s)
+    return jsonify({
+        "status": "sucesso", "elevador_id": elevador_id,
+        "de": de.isoformat(), "ate": ate.isoformat(), "resolucao_s": resolucao_s,
+        "fonte": fonte, "pontos": pontos
+    })
+
 @api_bp.route('/analise_diaria/<elevador_id>', methods=['GET'])
 @jwt_required()
 def get_analise_diaria(elevador_id):
@@ -225,37 +381,45 @@ def get_analise_diaria(elevador_id):
     if elevador.tecnico_id != identidade_tecnico['id']:
         return jsonify({"mensagem": "Acesso não autorizado"}), 403
         
-    analises = AnaliseDiaria.query.filter_by(elevador_id=elevador_id).order_by(AnaliseDiaria.data_referencia.desc()).all()
+    report_final = registro_modelos.analise_diaria(db.session.connection(), elevador_id)
     
-    if not analises:
+    if not report_final:
         return jsonify({"status": "vazio", "mensagem": "Nenhum dado de análise diária encontrado."})
-        
-    lista_analises = []
-    for a in analises:
-        lista_analises.append({
-            "data": a.data_referencia.strftime('%Y-%m-%d'),
-            "temp_media": a.temp_media, "temp_max": a.temp_max,
-            "vib_max": a.vib_max, "corrente_max": a.corrente_max,
-            "picos_corrente_alta": a.picos_corrente_alta,
-            "leituras_totais": a.leituras_totais
-        })
-    
-    df = pd.DataFrame(lista_analises)
-    
-    features = ['temp_media', 'temp_max', 'vib_max', 'corrente_max', 'picos_corrente_alta']
-    df_features = df[features].fillna(0)
 
-    if len(df_features) < 2:
-         df['anomalia'] = False
-         report_final = df.to_dict('records')
+    if len(report_final) < 2:
          return jsonify({"status": "sucesso", "analise": report_final, "info": "Dados insuficientes para detecção de anomalia."})
-
-    model = IsolationForest(contamination=0.1, random_state=42)
-    model.fit(df_features)
-    
-    df['anomalia'] = model.predict(df_features)
-    df['anomalia'] = df['anomalia'].apply(lambda x: True if x == -1 else False)
-    
-    report_final = df.to_dict('records')
         
     return jsonify({"status": "sucesso", "analise": report_final})
+
+@api_bp.route('/cache/metricas', methods=['GET'])
+def get_metricas_cache():
+    return jsonify(cache_respostas.metricas())
+
+@api_bp.route('/analise_diaria/modelos/metricas', methods=['GET'])
+def get_metricas_modelos():
+    return jsonify(registro_modelos.metricas())
+
+@api_bp.route('/anomalias/frota', methods=['GET'])
+@jwt_required()
+def get_anomalias_frota():
+    identidade_tecnico = get_jwt_identity()
+    tecnico_id = request.args.get('tecnico_id', identidade_tecnico['id'])
+    if tecnico_id != identidade_tecnico['id']:
+        return jsonify({"mensagem": "Acesso não autorizado"}), 403
+
+    consulta = (db.session.query(PontuacaoFrota, Elevador.nome, Elevador.predio)
+                .join(Elevador, Elevador.id == PontuacaoFrota.elevador_id)
+                .filter(Elevador.tecnico_id == tecnico_id))
+    if request.args.get('apenas_anomalias', '').lower() in ('1', 'true', 'sim'):
+        consulta = consulta.filter(PontuacaoFrota.anomalia.is_(True))
+    limite = request.args.get('limite', type=int)
+    consulta = consulta.order_by(PontuacaoFrota.anomalia.desc(), PontuacaoFrota.score.desc()).limit(limite)
+
+    ranking = []
+    for p, nome, predio in consulta.all():
+        ranking.append({
+            "elevador_id": p.elevador_id, "nome": nome, "predio": predio,
+            "data": p.data_referencia.strftime('%Y-%m-%d'), "score": p.score, "desvio_max": p.desvio_max, "anomalia": p.anomalia,
+            "calculado_em": p.calculado_em.isoformat() if p.calculado_em else None
+        })
+    return jsonify({"status": "sucesso", "tecnico_id": tecnico_id, "elevadores": ranking})
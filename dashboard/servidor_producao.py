@@ -0,0 +1,77 @@
+import os
+import sys
+import argparse
+import multiprocessing
+import subprocess
+import threading
+import broker_local
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+
+SERVIDORES = {
+    'api': ('api_server', '0.0.0.0:5001'),
+    'dashboard': ('dashboard_server', '0.0.0.0:5000'),
+}
+
+def criar_aplicacao(modulo, opcoes):
+    from gunicorn.app.base import BaseApplication
+
+    class AplicacaoGunicorn(BaseApplication):
+        def load_config(self):
+            for chave, valor in opcoes.items():
+                self.cfg.set(chave, valor)
+
+        def load(self):
+            return __import__(modulo).app
+
+    return AplicacaoGunicorn()
+
+def rodar_agendador():
+    from api_server import app, iniciar_agendador
+    from extensions import db
+    with app.app_context():
+        db.create_all()
+    iniciar_agendador()
+    print("Agendador de jobs (ETL e partições) em execução.")
+    threading.Event().wait()
+
+def servir(servidor, bind=None, workers=None, conexoes=2000, broker=None, pipeline=None):
+    modulo, bind_padrao = SERVIDORES[servidor]
+    opcoes = {
+        'bind': bind or bind_padrao,
+        'workers': workers or multiprocessing.cpu_count(),
+        'worker_class': 'gevent',
+        'worker_connections': conexoes,
+        'graceful_timeout': 10,
+        'keepalive': 30,
+    }
+
+    if pipeline:
+        os.environ['ASCENSUS_PIPELINE'] = pipeline
+
+    if servidor == 'dashboard':
+        endereco = broker_local.interpretar_endereco(broker)
+        os.environ['ASCENSUS_BROKER'] = f"{endereco[0]}:{endereco[1]}"
+        auxiliar = subprocess.Popen([sys.executable, os.path.join(basedir, 'broker_local.py'), os.environ['ASCENSUS_BROKER']])
+    else:
+        auxiliar = subprocess.Popen([sys.executable, os.path.abspath(__file__), 'agendador'])
+
+    print(f"Iniciando {modulo} em modo de produção: {opcoes['workers']} workers gevent em http://{opcoes['bind']}")
+    try:
+        criar_aplicacao(modulo, opcoes).run()
+    finally:
+        auxiliar.terminate()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Sobe a API ou o dashboard com gunicorn + gevent e vários workers.")
+    parser.add_argument('servidor', choices=sorted(SERVIDORES) + ['agendador'])
+    parser.add_argument('--bind', help="endereço host:porta (padrão: 0.0.0.0:5001 para a API, 0.0.0.0:5000 para o dashboard)")
+    parser.add_argument('--workers', type=int, help="número de processos (padrão: número de CPUs)")
+    parser.add_argument('--conexoes', type=int, default=2000, help="conexões simultâneas por worker")
+    parser.add_argument('--broker', help="endereço host:porta do broker local entre os workers do dashboard (padrão: 127.0.0.1:5002)")
+    parser.add_argument('--pipeline', choices=['unificado'], help="dashboard grava as leituras direto no banco, sem passar pela API via HTTP")
+    args = parser.parse_args()
+    if args.servidor == 'agendador':
+        rodar_agendador()
+    else:
+        servir(args.servidor, args.bind, args.workers, args.conexoes, args.broker, args.pipeline)